@@ -0,0 +1 @@
+"""Benchmarks for mbd core."""
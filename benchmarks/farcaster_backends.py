@@ -0,0 +1,67 @@
+"""Benchmark the farcaster transformation functions on each dataframe backend.
+
+Usage: python -m benchmarks.farcaster_backends --repeat 20 --backends pandas polars
+
+The test data is replicated ``repeat`` times. Items are only benchmarked with
+--items, since they fetch url metadata and load the language detection model.
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+from typing import Any
+
+import pandas as pd
+
+from mbd_core.data.farcaster.backends import BACKENDS, DataFrameBackend, get_backend
+
+DATA_DIR = "tests/data/farcaster"
+
+
+def _load(name: str, repeat: int) -> pd.DataFrame:
+    data_df = pd.read_parquet(f"{DATA_DIR}/{name}.parquet")
+    return pd.concat([data_df] * repeat, ignore_index=True)
+
+
+def _time(backend: DataFrameBackend, func: Callable[..., Any], *frames: Any) -> float:
+    """Time a transformation, including the collection of its result into pandas."""
+    start = time.perf_counter()
+    backend.to_pandas(func(*frames))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print the timings in seconds."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--backends", nargs="+", default=[backend.value for backend in BACKENDS]
+    )
+    parser.add_argument("--items", action="store_true")
+    args = parser.parse_args()
+
+    casts_df = _load("casts", args.repeat)
+    reactions_df = _load("reactions", args.repeat)
+    users_df = _load("users", args.repeat)
+
+    rows = []
+    for name in args.backends:
+        backend = get_backend(name)
+        casts, reactions, users = map(
+            backend.from_pandas, (casts_df, reactions_df, users_df)
+        )
+        timings = {
+            "backend": name,
+            "interaction_df": _time(
+                backend, backend.get_interaction_df, casts, reactions
+            ),
+            "user_df": _time(backend, backend.get_user_df, users),
+        }
+        if args.items:
+            timings["item_df"] = _time(backend, backend.get_item_df, casts)
+        rows.append(timings)
+    print(pd.DataFrame(rows).set_index("backend").round(3).to_string())  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Compaction of micro-batch message files into row-group-optimized parquet files.
+
+Micro-batch jobs write many small parquet files into the ``MESSAGE_FOLDER`` of a
+partition, e.g. ``items_meta_data/date=2024-07-01/message/*.parquet``. Compaction
+merges them into a few large, time-sorted files in the partition directory and
+writes ``MERGED_MESSAGE_FILE`` once the merged files are in place.
+
+Memory stays bounded by streaming: a first pass only reads the key and version
+columns to find the rows that survive deduplication, a second pass streams the
+surviving rows into sorted runs of at most ``run_rows`` rows, and the runs are
+k-way merged by the sort column while being written out.
+"""
+
+import shutil
+import tempfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, cast
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from mbd_core.data.schema import (
+    INTERACTION_DIR,
+    ITEM_COLUMN,
+    ITEM_CREATION_TIME_COLUMN,
+    ITEM_META_DIR,
+    ITEM_UPDATE_TIME_COLUMN,
+    MERGED_MESSAGE_FILE,
+    MESSAGE_FOLDER,
+    TIME_COLUMN,
+    USER_COLUMN,
+    USER_META_DIR,
+    USER_UPDATE_TIME_COLUMN,
+)
+from mbd_core.utils import atomic_write_text
+
+MERGED_FILE_PREFIX = "part-"
+DEFAULT_ROW_GROUP_SIZE = 128 * 1024
+DEFAULT_MAX_ROWS_PER_FILE = 8 * DEFAULT_ROW_GROUP_SIZE
+DEFAULT_RUN_ROWS = 2 * DEFAULT_ROW_GROUP_SIZE
+DEFAULT_BATCH_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class CompactionSpec:
+    """How the rows of one kind of dataset are deduplicated and sorted.
+
+    key_column: rows sharing a key are deduplicated, None keeps every row
+    version_column: among duplicated keys the row with the latest version is kept
+    sort_column: merged files are sorted by this column
+    """
+
+    sort_column: str
+    key_column: str | None = None
+    version_column: str | None = None
+
+
+ITEM_COMPACTION_SPEC = CompactionSpec(
+    sort_column=ITEM_CREATION_TIME_COLUMN,
+    key_column=ITEM_COLUMN,
+    version_column=ITEM_UPDATE_TIME_COLUMN,
+)
+USER_COMPACTION_SPEC = CompactionSpec(
+    sort_column=USER_UPDATE_TIME_COLUMN,
+    key_column=USER_COLUMN,
+    version_column=USER_UPDATE_TIME_COLUMN,
+)
+INTERACTION_COMPACTION_SPEC = CompactionSpec(sort_column=TIME_COLUMN)
+
+COMPACTION_SPECS = {
+    ITEM_META_DIR: ITEM_COMPACTION_SPEC,
+    USER_META_DIR: USER_COMPACTION_SPEC,
+    INTERACTION_DIR: INTERACTION_COMPACTION_SPEC,
+}
+
+
+def _list_message_files(partition_dir: Path) -> list[Path]:
+    return sorted((partition_dir / MESSAGE_FOLDER).glob("*.parquet"))
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Cast a table to the schema, with null columns for the fields it lacks.
+
+    Optional columns are missing from the files of micro-batches without them.
+    """
+    for field in schema:
+        if field.name not in table.column_names:
+            table = table.append_column(field, pa.nulls(len(table), field.type))
+    return table.select(schema.names).cast(schema)
+
+
+def _find_surviving_rows(
+    files: list[Path], spec: CompactionSpec, schema: pa.Schema
+) -> dict[int, np.ndarray] | None:
+    """Find the rows kept after deduplication, as row positions per file.
+
+    Only the key and version columns are read. Ties on the version are broken in
+    favour of the row written last. Returns None when no deduplication is needed.
+    """
+    if spec.key_column is None:
+        return None
+    version_column = spec.version_column or spec.sort_column
+    key_schema = pa.schema(
+        [schema.field(spec.key_column), schema.field(version_column)]
+    )
+    frames = []
+    for file_idx, path in enumerate(files):
+        columns = [
+            name for name in key_schema.names if name in pq.read_schema(path).names
+        ]
+        file_df = _conform(pq.read_table(path, columns=columns), key_schema).to_pandas()
+        file_df["_file"] = file_idx
+        file_df["_row"] = np.arange(len(file_df))
+        frames.append(file_df)
+    keys_df = pd.concat(frames, ignore_index=True)
+    keys_df = keys_df.sort_values(
+        by=[version_column, "_file", "_row"], kind="stable", na_position="first"
+    ).drop_duplicates(subset=spec.key_column, keep="last")
+    return {
+        file_idx: np.sort(group["_row"].to_numpy())
+        for file_idx, group in keys_df.groupby("_file")
+    }
+
+
+def _sort_values(table: pa.Table, column: str) -> np.ndarray:
+    values = table.column(column)
+    if pa.types.is_timestamp(values.type):
+        values = values.cast(pa.int64())
+    return cast(np.ndarray, values.to_numpy())
+
+
+def _write_sorted_runs(  # noqa: PLR0913
+    files: list[Path],
+    surviving_rows: dict[int, np.ndarray] | None,
+    schema: pa.Schema,
+    sort_column: str,
+    run_dir: Path,
+    *,
+    run_rows: int,
+    batch_size: int,
+) -> list[Path]:
+    """Stream surviving rows into sorted runs of at most ``run_rows`` rows."""
+    runs: list[Path] = []
+    buffer: list[pa.Table] = []
+    buffered_rows = 0
+
+    def flush() -> None:
+        nonlocal buffer, buffered_rows
+        if not buffered_rows:
+            return
+        run = pa.concat_tables(buffer).sort_by(sort_column)
+        run_path = run_dir / f"run-{len(runs):05d}.parquet"
+        pq.write_table(run, run_path, row_group_size=batch_size)
+        runs.append(run_path)
+        buffer, buffered_rows = [], 0
+
+    for file_idx, path in enumerate(files):
+        if surviving_rows is not None and file_idx not in surviving_rows:
+            continue
+        offset = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            table = _conform(pa.Table.from_batches([batch]), schema)
+            if surviving_rows is not None:
+                rows = surviving_rows[file_idx]
+                lo, hi = np.searchsorted(rows, [offset, offset + len(table)])
+                table = table.take(pa.array(rows[lo:hi] - offset))
+            offset += batch.num_rows
+            buffer.append(table)
+            buffered_rows += len(table)
+            if buffered_rows >= run_rows:
+                flush()
+    flush()
+    return runs
+
+
+def _merge_sorted_runs(
+    runs: list[Path], sort_column: str, batch_size: int
+) -> Iterator[pa.Table]:
+    """K-way merge of sorted runs, holding at most one batch per run in memory.
+
+    Rows up to the smallest last value among the current batches are safe to
+    emit, since every later batch of every run only holds values at least as big.
+    """
+    iterators = [
+        pq.ParquetFile(run).iter_batches(batch_size=batch_size) for run in runs
+    ]
+    heads: dict[int, pa.Table] = {}
+
+    def advance(run_idx: int) -> None:
+        batch = next(iterators[run_idx], None)
+        if batch is None:
+            heads.pop(run_idx, None)
+        else:
+            heads[run_idx] = pa.Table.from_batches([batch])
+
+    for run_idx in range(len(runs)):
+        advance(run_idx)
+    while heads:
+        bound = min(_sort_values(head, sort_column)[-1] for head in heads.values())
+        parts = []
+        for run_idx, head in list(heads.items()):
+            n = int(np.searchsorted(_sort_values(head, sort_column), bound, "right"))
+            parts.append(head.slice(0, n))
+            if n == len(head):
+                advance(run_idx)
+            else:
+                heads[run_idx] = head.slice(n)
+        yield pa.concat_tables(parts).sort_by(sort_column)
+
+
+def _write_merged_files(
+    tables: Iterator[pa.Table],
+    schema: pa.Schema,
+    out_dir: Path,
+    *,
+    row_group_size: int,
+    max_rows_per_file: int,
+) -> list[Path]:
+    """Write a stream of tables into files of at most ``max_rows_per_file`` rows."""
+    paths: list[Path] = []
+    writer: pq.ParquetWriter | None = None
+    rows_in_file = 0
+    pending: list[pa.Table] = []
+    pending_rows = 0
+
+    def write_pending(*, final: bool) -> None:
+        nonlocal writer, rows_in_file, pending, pending_rows
+        # only write full row groups, except for the tail of the stream
+        while pending_rows >= row_group_size or (final and pending_rows):
+            chunk = pa.concat_tables(pending)
+            size = min(row_group_size, max_rows_per_file - rows_in_file, len(chunk))
+            if writer is None:
+                paths.append(out_dir / f"{MERGED_FILE_PREFIX}{len(paths):05d}.parquet")
+                writer = pq.ParquetWriter(paths[-1], schema)
+            writer.write_table(chunk.slice(0, size), row_group_size=row_group_size)
+            rows_in_file += size
+            pending, pending_rows = [chunk.slice(size)], len(chunk) - size
+            if rows_in_file >= max_rows_per_file:
+                writer.close()
+                writer, rows_in_file = None, 0
+
+    for table in tables:
+        pending.append(table)
+        pending_rows += len(table)
+        write_pending(final=False)
+    write_pending(final=True)
+    if writer is not None:
+        writer.close()
+    return paths
+
+
+def is_partition_compacted(partition_dir: str | Path) -> bool:
+    """Whether the partition already has its merging completion marker."""
+    return (Path(partition_dir) / MERGED_MESSAGE_FILE).exists()
+
+
+def compact_partition(  # noqa: PLR0913
+    partition_dir: str | Path,
+    spec: CompactionSpec,
+    *,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    max_rows_per_file: int = DEFAULT_MAX_ROWS_PER_FILE,
+    run_rows: int = DEFAULT_RUN_ROWS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    overwrite: bool = False,
+) -> list[Path]:
+    """Compact the message files of a partition into merged files.
+
+    The merged files are written to a temporary directory first and moved into the
+    partition directory, replacing the merged files of any previous attempt. The
+    completion marker is written last, so a partition without the marker is never
+    read as complete. Partitions that already have the marker are skipped unless
+    overwrite is set. Returns the merged files of the partition.
+    """
+    partition_dir = Path(partition_dir)
+    if is_partition_compacted(partition_dir) and not overwrite:
+        return sorted(partition_dir.glob(f"{MERGED_FILE_PREFIX}*.parquet"))
+    files = _list_message_files(partition_dir)
+    if not files:
+        msg = f"No message files to compact in {partition_dir / MESSAGE_FOLDER}"
+        raise FileNotFoundError(msg)
+
+    # columns that are all null in a micro-batch are typed null in its file, and
+    # optional columns may be missing from it
+    schema = pa.unify_schemas(
+        [pq.read_schema(path) for path in files], promote_options="permissive"
+    )
+    with tempfile.TemporaryDirectory(dir=partition_dir, prefix=".compaction-") as tmp:
+        run_dir, out_dir = Path(tmp) / "runs", Path(tmp) / "out"
+        run_dir.mkdir()
+        out_dir.mkdir()
+        runs = _write_sorted_runs(
+            files,
+            _find_surviving_rows(files, spec, schema),
+            schema,
+            spec.sort_column,
+            run_dir,
+            run_rows=run_rows,
+            batch_size=batch_size,
+        )
+        merged = _write_merged_files(
+            _merge_sorted_runs(runs, spec.sort_column, batch_size),
+            schema,
+            out_dir,
+            row_group_size=row_group_size,
+            max_rows_per_file=max_rows_per_file,
+        )
+
+        (partition_dir / MERGED_MESSAGE_FILE).unlink(missing_ok=True)
+        for stale in partition_dir.glob(f"{MERGED_FILE_PREFIX}*.parquet"):
+            stale.unlink()
+        paths = [path.replace(partition_dir / path.name) for path in merged]
+    atomic_write_text(
+        partition_dir / MERGED_MESSAGE_FILE,
+        "".join(f"{path.name}\n" for path in paths),
+    )
+    return paths
+
+
+def find_uncompacted_partitions(data_dir: str | Path) -> list[Path]:
+    """Find partitions under data_dir with message files and no completion marker."""
+    return sorted(
+        message_dir.parent
+        for message_dir in Path(data_dir).rglob(MESSAGE_FOLDER)
+        if message_dir.is_dir() and not is_partition_compacted(message_dir.parent)
+    )
+
+
+def compact_dataset(root_dir: str | Path, **kwargs: Any) -> dict[Path, list[Path]]:
+    """Compact all uncompacted partitions of the mbd datasets under root_dir.
+
+    Datasets are found by their generic directory names, e.g. ``ITEM_META_DIR``,
+    and compacted with the matching spec in ``COMPACTION_SPECS``.
+    """
+    compacted = {}
+    for dataset_dir, spec in COMPACTION_SPECS.items():
+        for partition_dir in find_uncompacted_partitions(Path(root_dir) / dataset_dir):
+            compacted[partition_dir] = compact_partition(partition_dir, spec, **kwargs)
+    return compacted
+
+
+def remove_message_files(partition_dir: str | Path) -> None:
+    """Remove the message files of a compacted partition."""
+    partition_dir = Path(partition_dir)
+    if not is_partition_compacted(partition_dir):
+        msg = f"Partition {partition_dir} has not been compacted"
+        raise ValueError(msg)
+    shutil.rmtree(partition_dir / MESSAGE_FOLDER)
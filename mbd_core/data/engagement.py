@@ -0,0 +1,251 @@
+"""Streaming engagement aggregates over interaction batches.
+
+An ``EngagementAggregator`` consumes the batches produced by ``get_interaction_df``
+and keeps, per key (e.g. ``ITEM_COLUMN`` or ``USER_COLUMN``) and per ``EVENT_TYPES``:
+
+- exact counts in tumbling windows aligned to ``UNIX_HOUR``
+- exponentially time-decayed scores
+
+Decayed scores are stored relative to a fixed anchor time, so contributions of a
+new batch are simply added and updating costs O(batch) instead of O(history).
+Batches are aggregated on arrival and merged into the state lazily, when it is
+read or when too many aggregated batches are pending.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.schema import (
+    DEFAULT_EVENT_VALUE,
+    EDGE_TYPE_COLUMN,
+    EVENT_TYPES,
+    EVENT_VALUE_COLUMN,
+    ITEM_COLUMN,
+    TIME_COLUMN,
+    UNIX_HOUR,
+)
+from mbd_core.utils import MAX_DECAY_EXPONENT, to_unix_seconds
+
+EVENT_COLUMNS = [et.value for et in EVENT_TYPES]
+WINDOW_HOURS = {"hour": 1, "day": 24}
+SECONDS_PER_HOUR = 3600
+DEFAULT_HALF_LIFE = pd.Timedelta(days=1)
+MAX_PENDING_BATCHES = 64
+
+_COUNTS_FILE = "counts.parquet"
+_SCORES_FILE = "scores.parquet"
+_META_FILE = "meta.json"
+
+
+class EngagementAggregator:
+    """Windowed counts and time-decayed scores of interactions per key.
+
+    Use one aggregator per key column, e.g. one for items and one for users, and
+    feed both with the same interaction batches.
+    """
+
+    def __init__(
+        self,
+        key_column: str = ITEM_COLUMN,
+        window: str = "hour",
+        half_life: pd.Timedelta = DEFAULT_HALF_LIFE,
+    ) -> None:
+        """Create an empty aggregator.
+
+        key_column: column of the interactions to aggregate by
+        window: tumbling window size, one of WINDOW_HOURS
+        half_life: time for a decayed score contribution to halve
+        """
+        if window not in WINDOW_HOURS:
+            msg = f"Unknown window {window}, expected one of {list(WINDOW_HOURS)}"
+            raise ValueError(msg)
+        self.key_column = key_column
+        self.window = window
+        self.half_life = pd.Timedelta(half_life)
+        self._anchor: int | None = None
+        self._latest: int | None = None
+        self._counts = pd.DataFrame(
+            columns=EVENT_COLUMNS,
+            index=pd.MultiIndex.from_arrays([[], []], names=[key_column, UNIX_HOUR]),
+            dtype=np.int64,
+        )
+        self._scores = pd.DataFrame(
+            columns=EVENT_COLUMNS,
+            index=pd.Index([], name=key_column, dtype=object),
+            dtype=np.float64,
+        )
+        self._pending_counts: list[pd.DataFrame] = []
+        self._pending_scores: list[pd.DataFrame] = []
+
+    @property
+    def _half_life_seconds(self) -> float:
+        return float(self.half_life.total_seconds())
+
+    def _rebase(self, anchor: int) -> None:
+        """Move the anchor of the decayed scores, rescaling the stored state."""
+        assert self._anchor is not None
+        factor = np.exp2((self._anchor - anchor) / self._half_life_seconds)
+        self._compact()
+        self._scores *= factor
+        self._anchor = anchor
+
+    def update(self, interaction_df: pd.DataFrame) -> None:
+        """Add a batch of interactions following INTERACTION_SCHEMA."""
+        if interaction_df.empty:
+            return
+        seconds = to_unix_seconds(interaction_df[TIME_COLUMN])
+        batch_latest = int(seconds.max())
+        if self._anchor is None:
+            self._anchor = int(seconds.min())
+        if (batch_latest - self._anchor) / self._half_life_seconds > MAX_DECAY_EXPONENT:
+            self._rebase(batch_latest)
+        self._latest = max(batch_latest, self._latest or batch_latest)
+
+        window_hours = WINDOW_HOURS[self.window]
+        values = (
+            interaction_df[EVENT_VALUE_COLUMN].fillna(DEFAULT_EVENT_VALUE).to_numpy()
+            if EVENT_VALUE_COLUMN in interaction_df
+            else DEFAULT_EVENT_VALUE
+        )
+        batch_df = pd.DataFrame(
+            {
+                self.key_column: interaction_df[self.key_column].to_numpy(),
+                UNIX_HOUR: seconds // SECONDS_PER_HOUR // window_hours * window_hours,
+                EDGE_TYPE_COLUMN: interaction_df[EDGE_TYPE_COLUMN].to_numpy(),
+                "_score": values
+                * np.exp2((seconds - self._anchor) / self._half_life_seconds),
+            }
+        )
+        counts = batch_df.groupby([self.key_column, UNIX_HOUR, EDGE_TYPE_COLUMN]).size()
+        scores = batch_df.groupby([self.key_column, EDGE_TYPE_COLUMN])["_score"].sum()
+        counts = counts.unstack(fill_value=0)  # noqa: PD010
+        scores = scores.unstack(fill_value=0.0)  # noqa: PD010
+        self._pending_counts.append(counts.reindex(columns=EVENT_COLUMNS, fill_value=0))
+        self._pending_scores.append(
+            scores.reindex(columns=EVENT_COLUMNS, fill_value=0.0)
+        )
+        if len(self._pending_counts) > MAX_PENDING_BATCHES:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Merge the pending aggregated batches into the state."""
+        if self._pending_counts:
+            self._counts = (
+                pd.concat([self._counts, *self._pending_counts])
+                .groupby(level=[self.key_column, UNIX_HOUR])
+                .sum()
+                .astype(np.int64)
+            )
+            self._pending_counts = []
+        if self._pending_scores:
+            self._scores = (
+                pd.concat([self._scores, *self._pending_scores])
+                .groupby(level=self.key_column)
+                .sum()
+            )
+            self._pending_scores = []
+
+    def counts(
+        self, start: pd.Timestamp | None = None, end: pd.Timestamp | None = None
+    ) -> pd.DataFrame:
+        """Counts per key and window, for the windows starting in [start, end).
+
+        The frame is indexed by the key column and UNIX_HOUR, the first hour of
+        the window, and has one column per event type.
+        """
+        self._compact()
+        windows = self._counts.index.get_level_values(UNIX_HOUR)
+        mask = np.ones(len(windows), dtype=bool)
+        if start is not None:
+            mask &= windows >= pd.Timestamp(start).timestamp() // SECONDS_PER_HOUR
+        if end is not None:
+            mask &= windows < pd.Timestamp(end).timestamp() // SECONDS_PER_HOUR
+        return self._counts[mask].copy()
+
+    def totals(
+        self, start: pd.Timestamp | None = None, end: pd.Timestamp | None = None
+    ) -> pd.DataFrame:
+        """Counts per key summed over the windows starting in [start, end)."""
+        return self.counts(start, end).groupby(level=self.key_column).sum()
+
+    def scores(self, at: pd.Timestamp | None = None) -> pd.DataFrame:
+        """Time-decayed scores per key at a given time, by default the latest seen.
+
+        at must not be before the latest interaction seen, since later
+        interactions would be counted with a weight above 1.
+        """
+        self._compact()
+        if self._anchor is None:
+            return self._scores.copy()
+        assert self._latest is not None
+        at_seconds = self._latest if at is None else int(pd.Timestamp(at).timestamp())
+        if at_seconds < self._latest:
+            msg = f"Cannot score at {at}, before the latest interaction seen"
+            raise ValueError(msg)
+        return self._scores * np.exp2(
+            (self._anchor - at_seconds) / self._half_life_seconds
+        )
+
+    def drop_windows_before(self, start: pd.Timestamp) -> None:
+        """Drop the counts of windows starting before start."""
+        self._compact()
+        self._counts = self.counts(start=start)
+
+    def merge(self, other: "EngagementAggregator") -> None:
+        """Merge the state of another aggregator with the same configuration."""
+        if (other.key_column, other.window, other.half_life) != (
+            self.key_column,
+            self.window,
+            self.half_life,
+        ):
+            msg = "Cannot merge aggregators with different configurations"
+            raise ValueError(msg)
+        if other._anchor is None or other._latest is None:
+            return
+        if self._anchor is None:
+            self._anchor = other._anchor
+        if (
+            other._anchor - self._anchor
+        ) / self._half_life_seconds > MAX_DECAY_EXPONENT:
+            self._rebase(other._anchor)
+        factor = np.exp2((other._anchor - self._anchor) / self._half_life_seconds)
+        other._compact()
+        self._pending_counts.append(other._counts)
+        self._pending_scores.append(other._scores * factor)
+        self._latest = max(self._latest or other._latest, other._latest)
+        self._compact()
+
+    def save(self, path: str | Path) -> None:
+        """Persist the state to a directory."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self._compact()
+        self._counts.to_parquet(path / _COUNTS_FILE)
+        self._scores.to_parquet(path / _SCORES_FILE)
+        meta = {
+            "key_column": self.key_column,
+            "window": self.window,
+            "half_life_seconds": self._half_life_seconds,
+            "anchor": self._anchor,
+            "latest": self._latest,
+        }
+        (path / _META_FILE).write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "EngagementAggregator":
+        """Load a state persisted with save."""
+        path = Path(path)
+        meta = json.loads((path / _META_FILE).read_text())
+        aggregator = cls(
+            key_column=meta["key_column"],
+            window=meta["window"],
+            half_life=pd.Timedelta(seconds=meta["half_life_seconds"]),
+        )
+        aggregator._anchor = meta["anchor"]
+        aggregator._latest = meta["latest"]
+        aggregator._counts = pd.read_parquet(path / _COUNTS_FILE)
+        aggregator._scores = pd.read_parquet(path / _SCORES_FILE)
+        return aggregator
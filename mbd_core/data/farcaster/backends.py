@@ -0,0 +1,97 @@
+"""Execution backends for the farcaster transformation functions.
+
+- pandas: the default, ``transform_functions`` on pandas frames
+- modin: the same functions on modin frames, which run on all cores
+- polars: the lazy implementation in ``polars_transforms``
+
+The backend is picked by name, or with the ``MBD_DATAFRAME_BACKEND`` environment
+variable when no name is given. Modin and polars are optional dependencies and are
+only imported when their backend is requested.
+"""
+
+import importlib
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+
+import pandas as pd
+
+from mbd_core.data.farcaster import transform_functions
+
+BACKEND_ENV_VAR = "MBD_DATAFRAME_BACKEND"
+
+
+class BACKENDS(Enum):
+    """Supported dataframe backends."""
+
+    pandas = "pandas"
+    modin = "modin"
+    polars = "polars"
+
+
+@dataclass(frozen=True)
+class DataFrameBackend:
+    """Transformation functions of a backend and conversions from/to pandas."""
+
+    name: str
+    get_item_df: Callable[..., Any]
+    get_interaction_df: Callable[..., Any]
+    get_user_df: Callable[..., Any]
+    from_pandas: Callable[[pd.DataFrame], Any]
+    to_pandas: Callable[[Any], pd.DataFrame]
+
+
+def _import_optional(module: str, backend: BACKENDS) -> Any:
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        msg = f"Install mbd_core[{backend.value}] to use the {backend.value} backend"
+        raise ImportError(msg) from e
+
+
+def _polars_to_pandas(frame: Any) -> pd.DataFrame:
+    """Collect a polars frame into pandas, with python lists for list columns."""
+    polars = _import_optional("polars", BACKENDS.polars)
+    polars_df = frame.collect() if isinstance(frame, polars.LazyFrame) else frame
+    list_columns = [
+        col for col, dtype in polars_df.schema.items() if isinstance(dtype, polars.List)
+    ]
+    pandas_df = polars_df.drop(list_columns).to_pandas()
+    for col in list_columns:
+        pandas_df[col] = pd.Series(polars_df[col].to_list(), index=pandas_df.index)
+    return pandas_df[polars_df.columns]
+
+
+def get_backend(name: str | None = None) -> DataFrameBackend:
+    """Get a backend by name, by default the one set in MBD_DATAFRAME_BACKEND."""
+    backend = BACKENDS(name or os.environ.get(BACKEND_ENV_VAR, BACKENDS.pandas.value))
+    if backend == BACKENDS.polars:
+        polars = _import_optional("polars", BACKENDS.polars)
+        polars_transforms = importlib.import_module(
+            "mbd_core.data.farcaster.polars_transforms"
+        )
+        return DataFrameBackend(
+            name=backend.value,
+            get_item_df=polars_transforms.get_item_df,
+            get_interaction_df=polars_transforms.get_interaction_df,
+            get_user_df=polars_transforms.get_user_df,
+            from_pandas=polars.from_pandas,
+            to_pandas=_polars_to_pandas,
+        )
+
+    if backend == BACKENDS.modin:
+        modin_pd = _import_optional("modin.pandas", BACKENDS.modin)
+        from_pandas, to_pandas = modin_pd.DataFrame, lambda df: df._to_pandas()
+    else:
+        from_pandas, to_pandas = pd.DataFrame.copy, pd.DataFrame.copy
+    # transform_functions run on modin frames as they do on pandas frames
+    return DataFrameBackend(
+        name=backend.value,
+        get_item_df=transform_functions.get_item_df,
+        get_interaction_df=transform_functions.get_interaction_df,
+        get_user_df=transform_functions.get_user_df,
+        from_pandas=from_pandas,
+        to_pandas=to_pandas,
+    )
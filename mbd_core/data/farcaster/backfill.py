@@ -0,0 +1,359 @@
+"""Checkpointed, resumable backfill of the farcaster transformation functions.
+
+A backfill splits the time range of the input messages into work units, one per
+dataset and time range, and runs them in parallel processes:
+
+- ``ITEM_META_DIR``: ``get_item_df`` of the casts of the range
+- ``INTERACTION_DIR``: ``get_interaction_df`` of the casts and reactions
+- ``USER_META_DIR``: ``get_user_df`` of the user data messages
+
+Each unit reads only its time range, with a filter pushed down to parquet, and
+writes its output as a message file of the date partition of its start, e.g.
+``items_meta_data/date=2024-07-01/message/part-<start>-<end>.parquet``, ready for
+``compaction``. Outputs and then checkpoints are written atomically, so after
+a crash a backfill with the same output directory only runs the units without a
+checkpoint.
+
+Usage: mbd-backfill --casts casts/ --reactions reactions/ --users users/ --out out/
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from mbd_core.data.farcaster.transform_functions import (
+    get_interaction_df,
+    get_item_df,
+    get_user_df,
+)
+from mbd_core.data.schema import (
+    INTERACTION_DIR,
+    ITEM_META_DIR,
+    MESSAGE_FOLDER,
+    USER_META_DIR,
+)
+from mbd_core.utils import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+DATASETS = (ITEM_META_DIR, INTERACTION_DIR, USER_META_DIR)
+DEFAULT_UNIT = pd.Timedelta(days=1)
+CHECKPOINT_DIR = "_backfill"
+MESSAGE_TIME_COLUMN = "timestamp"
+
+_UNIT_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+@dataclass(frozen=True)
+class BackfillInputs:
+    """Parquet files or directories of the raw farcaster messages."""
+
+    casts: Path | None = None
+    reactions: Path | None = None
+    users: Path | None = None
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    """Transformation of the messages of [start, end) into one dataset."""
+
+    dataset: str
+    start: pd.Timestamp
+    end: pd.Timestamp
+
+    @property
+    def name(self) -> str:
+        """Name of the unit, unique within a dataset."""
+        return (
+            f"{self.start.strftime(_UNIT_TIME_FORMAT)}-"
+            f"{self.end.strftime(_UNIT_TIME_FORMAT)}"
+        )
+
+    def output_path(self, out_dir: Path) -> Path:
+        """Message file of the unit, in the date partition of its start."""
+        partition = f"date={self.start.strftime('%Y-%m-%d')}"
+        return (
+            out_dir
+            / self.dataset
+            / partition
+            / MESSAGE_FOLDER
+            / f"part-{self.name}.parquet"
+        )
+
+    def checkpoint_path(self, out_dir: Path) -> Path:
+        """Checkpoint written once the output of the unit is complete."""
+        return out_dir / CHECKPOINT_DIR / self.dataset / f"{self.name}.json"
+
+
+@dataclass(frozen=True)
+class UnitResult:
+    """Outcome of a completed work unit, stored as its checkpoint."""
+
+    dataset: str
+    name: str
+    rows: int
+    seconds: float
+    output: str | None
+
+
+class BackfillError(Exception):
+    """Raised when some work units failed, after all the others completed."""
+
+
+def _to_utc(timestamp: pd.Timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _time_filter(
+    dataset: ds.Dataset, start: pd.Timestamp, end: pd.Timestamp
+) -> pc.Expression:
+    """Filter of the messages in [start, end), with bounds of the column type."""
+    column_type = dataset.schema.field(MESSAGE_TIME_COLUMN).type
+    if pa.types.is_timestamp(column_type) and column_type.tz is None:
+        start, end = start.tz_localize(None), end.tz_localize(None)
+    field = pc.field(MESSAGE_TIME_COLUMN)
+    return (field >= pa.scalar(start, type=column_type)) & (
+        field < pa.scalar(end, type=column_type)
+    )
+
+
+def read_time_range(path: Path, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Read the messages of [start, end) from parquet files."""
+    dataset = ds.dataset(path, format="parquet")
+    return dataset.to_table(filter=_time_filter(dataset, start, end)).to_pandas()
+
+
+def get_time_range(paths: Sequence[Path]) -> tuple[pd.Timestamp, pd.Timestamp]:
+    """Earliest and latest message times of parquet files, reading only times."""
+    bounds = []
+    for path in paths:
+        times = ds.dataset(path, format="parquet").to_table(
+            columns=[MESSAGE_TIME_COLUMN]
+        )
+        min_max = pc.min_max(times.column(MESSAGE_TIME_COLUMN))
+        bounds += [min_max["min"].as_py(), min_max["max"].as_py()]
+    bounds = [pd.Timestamp(b) for b in bounds if b is not None]
+    if not bounds:
+        msg = f"No messages in {list(map(str, paths))}"
+        raise ValueError(msg)
+    bounds = [_to_utc(b) for b in bounds]
+    return min(bounds), max(bounds)
+
+
+def get_work_units(
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    unit: pd.Timedelta = DEFAULT_UNIT,
+    datasets: Sequence[str] = DATASETS,
+) -> list[WorkUnit]:
+    """Split [start, end] into units of the given duration, aligned on the epoch.
+
+    Units of durations dividing a day never span two date partitions.
+    """
+    unit = pd.Timedelta(unit)
+    start, end = _to_utc(start), _to_utc(end)
+    starts = pd.date_range(start.floor(unit), end, freq=unit)
+    return [
+        WorkUnit(dataset=dataset, start=unit_start, end=unit_start + unit)
+        for dataset in datasets
+        for unit_start in starts
+    ]
+
+
+def _transform(unit: WorkUnit, inputs: BackfillInputs) -> pd.DataFrame | None:
+    """Output of a unit, None when it has no input messages."""
+
+    def read(path: Path | None) -> pd.DataFrame:
+        if path is None:
+            msg = f"Missing input messages for {unit.dataset}"
+            raise ValueError(msg)
+        return read_time_range(path, unit.start, unit.end)
+
+    if unit.dataset == ITEM_META_DIR:
+        casts_df = read(inputs.casts)
+        return None if casts_df.empty else get_item_df(casts_df)
+    if unit.dataset == INTERACTION_DIR:
+        casts_df, reactions_df = read(inputs.casts), read(inputs.reactions)
+        if casts_df.empty and reactions_df.empty:
+            return None
+        return get_interaction_df(casts_df, reactions_df)
+    if unit.dataset == USER_META_DIR:
+        users_df = read(inputs.users)
+        return None if users_df.empty else get_user_df(users_df)
+    msg = f"Unknown dataset {unit.dataset}, expected one of {DATASETS}"
+    raise ValueError(msg)
+
+
+def run_unit(unit: WorkUnit, inputs: BackfillInputs, out_dir: Path) -> UnitResult:
+    """Run a work unit, writing its output and then its checkpoint atomically."""
+    start = time.perf_counter()
+    output_df = _transform(unit, inputs)
+    output = None
+    if output_df is not None:
+        output_path = unit.output_path(out_dir)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+        output_df.to_parquet(tmp_path, index=False)
+        tmp_path.replace(output_path)
+        output = str(output_path)
+    result = UnitResult(
+        dataset=unit.dataset,
+        name=unit.name,
+        rows=0 if output_df is None else len(output_df),
+        seconds=time.perf_counter() - start,
+        output=output,
+    )
+    checkpoint_path = unit.checkpoint_path(out_dir)
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(checkpoint_path, json.dumps(asdict(result)))
+    return result
+
+
+def is_unit_done(unit: WorkUnit, out_dir: Path) -> bool:
+    """Whether a unit has completed in a previous run."""
+    return unit.checkpoint_path(out_dir).exists()
+
+
+class _Progress:
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    def log(self, unit: WorkUnit, result: UnitResult | None) -> None:
+        self.done += 1
+        elapsed = time.perf_counter() - self.start
+        eta = elapsed / self.done * (self.total - self.done)
+        if result is None:
+            logger.error(
+                "[%d/%d] %s %s failed", self.done, self.total, unit.dataset, unit.name
+            )
+            return
+        self.rows += result.rows
+        logger.info(
+            "[%d/%d] %s %s: %d rows in %.1fs, %.0f rows/s overall, eta %.0fs",
+            self.done,
+            self.total,
+            unit.dataset,
+            unit.name,
+            result.rows,
+            result.seconds,
+            self.rows / elapsed,
+            eta,
+        )
+
+
+def _run_units(
+    units: list[WorkUnit], inputs: BackfillInputs, out_dir: Path, workers: int | None
+) -> Iterator[tuple[WorkUnit, UnitResult | BaseException]]:
+    """Run units, yielding each with its result or error as it completes."""
+    if (workers or os.cpu_count()) == 1:
+        for work_unit in units:
+            try:
+                yield work_unit, run_unit(work_unit, inputs, out_dir)
+            except Exception as e:  # noqa: BLE001
+                yield work_unit, e
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_unit, work_unit, inputs, out_dir): work_unit
+            for work_unit in units
+        }
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], future.result() if error is None else error
+
+
+def run_backfill(  # noqa: PLR0913
+    inputs: BackfillInputs,
+    out_dir: str | Path,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    unit: pd.Timedelta = DEFAULT_UNIT,
+    datasets: Sequence[str] = DATASETS,
+    workers: int | None = None,
+) -> list[UnitResult]:
+    """Run the work units without checkpoint in out_dir, in parallel processes.
+
+    start, end: time range to backfill, by default the range of the inputs
+    unit: duration of the time range of a work unit
+    workers: number of processes, the number of cpus if None, 1 runs the units in
+        the current process
+
+    Returns the results of the units run. Failed units are logged, and a
+    BackfillError is raised once the other units are done; running the backfill
+    again resumes them.
+    """
+    out_dir = Path(out_dir)
+    if start is None or end is None:
+        paths = [path for path in asdict(inputs).values() if path is not None]
+        data_start, data_end = get_time_range(paths)
+        start = data_start if start is None else start
+        end = data_end if end is None else end
+    units = get_work_units(start, end, unit, datasets)
+    pending = [u for u in units if not is_unit_done(u, out_dir)]
+    logger.info(
+        "Backfill of %d units, %d already done", len(units), len(units) - len(pending)
+    )
+
+    progress = _Progress(len(pending))
+    results, failed = [], []
+    for work_unit, outcome in _run_units(pending, inputs, out_dir, workers):
+        if isinstance(outcome, UnitResult):
+            results.append(outcome)
+            progress.log(work_unit, outcome)
+            continue
+        logger.error(
+            "Unit %s %s failed", work_unit.dataset, work_unit.name, exc_info=outcome
+        )
+        failed.append(work_unit)
+        progress.log(work_unit, None)
+
+    if failed:
+        msg = f"{len(failed)} units failed: {[(u.dataset, u.name) for u in failed]}"
+        raise BackfillError(msg)
+    return results
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run a backfill from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--casts", type=Path)
+    parser.add_argument("--reactions", type=Path)
+    parser.add_argument("--users", type=Path)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--start", type=pd.Timestamp)
+    parser.add_argument("--end", type=pd.Timestamp)
+    parser.add_argument(
+        "--unit", type=pd.Timedelta, default=DEFAULT_UNIT, help="e.g. 1d or 6h"
+    )
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    run_backfill(
+        BackfillInputs(casts=args.casts, reactions=args.reactions, users=args.users),
+        args.out,
+        start=args.start,
+        end=args.end,
+        unit=args.unit,
+        datasets=args.datasets,
+        workers=args.workers,
+    )
@@ -0,0 +1,214 @@
+"""Compact follow graph for farcaster users.
+
+Fids are interned to consecutive integer ids. The follow edges are kept in both
+directions as sorted arrays of encoded ``(node, neighbour)`` id pairs, with the
+CSR row pointers of the nodes. Link add and remove events are applied by merging
+the sorted batch into the pairs with binary searches and shifting the row
+pointers, so a batch costs a memory move instead of a re-sort of every edge.
+"""
+
+from dataclasses import dataclass, field
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.farcaster.transform_functions import LINK_TYPE_MAP
+from mbd_core.data.schema import USER1_COLUMN, USER2_COLUMN
+
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Concatenate the CSR rows of the given nodes without a python loop."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(lengths.sum())]
+
+
+@dataclass
+class _Adjacency:
+    """Sorted encoded (node, neighbour) pairs and the CSR row pointers of nodes."""
+
+    pairs: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    indptr: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+
+    def add_nodes(self, n_new: int) -> None:
+        self.indptr = np.concatenate(
+            [self.indptr, np.full(n_new, self.indptr[-1], dtype=np.int64)]
+        )
+
+    def contains(self, pairs: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.pairs, pairs)
+        found = positions < len(self.pairs)
+        found[found] = self.pairs[positions[found]] == pairs[found]
+        return found
+
+    def _shift_indptr(self, pairs: np.ndarray, sign: int) -> None:
+        counts = np.bincount(pairs >> _ID_BITS, minlength=len(self.indptr) - 1)
+        self.indptr[1:] += sign * np.cumsum(counts)
+
+    def insert(self, pairs: np.ndarray) -> None:
+        """Insert pairs that are not in the adjacency yet."""
+        pairs = np.sort(pairs)
+        self.pairs = np.insert(self.pairs, np.searchsorted(self.pairs, pairs), pairs)
+        self._shift_indptr(pairs, 1)
+
+    def delete(self, pairs: np.ndarray) -> None:
+        """Delete pairs that are in the adjacency."""
+        self.pairs = np.delete(self.pairs, np.searchsorted(self.pairs, pairs))
+        self._shift_indptr(pairs, -1)
+
+    def neighbours(self, node: int) -> np.ndarray:
+        return self.pairs[self.indptr[node] : self.indptr[node + 1]] & _ID_MASK
+
+
+def _reverse(pairs: np.ndarray) -> np.ndarray:
+    return ((pairs & _ID_MASK) << _ID_BITS) | (pairs >> _ID_BITS)
+
+
+class FollowGraph:
+    """Follow graph with integer-interned fids and CSR follower/following arrays."""
+
+    def __init__(self) -> None:
+        """Create an empty follow graph."""
+        self._fids = np.empty(0, dtype=np.int64)
+        self._fid_index = pd.Index(self._fids)
+        self._following = _Adjacency()
+        self._followers = _Adjacency()
+
+    @classmethod
+    def from_user_interaction_df(
+        cls, user_interaction_df: pd.DataFrame
+    ) -> "FollowGraph":
+        """Build the graph from a dataframe following USER_INTERACTION_SCHEMA."""
+        graph = cls()
+        graph.add_edges(
+            user_interaction_df[USER1_COLUMN].astype(np.int64).to_numpy(),
+            user_interaction_df[USER2_COLUMN].astype(np.int64).to_numpy(),
+        )
+        return graph
+
+    @property
+    def num_users(self) -> int:
+        """Number of interned fids."""
+        return len(self._fids)
+
+    @property
+    def num_edges(self) -> int:
+        """Number of follow edges."""
+        return len(self._following.pairs)
+
+    def _intern(self, fids: np.ndarray) -> np.ndarray:
+        ids = self._fid_index.get_indexer(fids)
+        new_fids = pd.unique(fids[ids < 0])
+        if len(new_fids):
+            self._fids = np.concatenate([self._fids, new_fids])
+            self._fid_index = pd.Index(self._fids)
+            ids = self._fid_index.get_indexer(fids)
+            self._following.add_nodes(len(new_fids))
+            self._followers.add_nodes(len(new_fids))
+        return cast(np.ndarray, ids.astype(np.int64))
+
+    def _lookup(self, fid: int) -> int:
+        return int(self._fid_index.get_indexer([fid])[0])
+
+    def add_edges(self, follower_fids: np.ndarray, followee_fids: np.ndarray) -> None:
+        """Add follow edges, interning fids that are not in the graph yet."""
+        sources = self._intern(np.asarray(follower_fids, dtype=np.int64))
+        targets = self._intern(np.asarray(followee_fids, dtype=np.int64))
+        edges = np.unique((sources << _ID_BITS) | targets)
+        added = edges[~self._following.contains(edges)]
+        self._following.insert(added)
+        self._followers.insert(_reverse(added))
+
+    def remove_edges(
+        self, follower_fids: np.ndarray, followee_fids: np.ndarray
+    ) -> None:
+        """Remove follow edges, ignoring edges that are not in the graph."""
+        sources = self._fid_index.get_indexer(np.asarray(follower_fids, dtype=np.int64))
+        targets = self._fid_index.get_indexer(np.asarray(followee_fids, dtype=np.int64))
+        known = (sources >= 0) & (targets >= 0)
+        edges = np.unique(
+            (sources[known].astype(np.int64) << _ID_BITS) | targets[known]
+        )
+        removed = edges[self._following.contains(edges)]
+        self._following.delete(removed)
+        self._followers.delete(_reverse(removed))
+
+    def apply_links(self, links_df: pd.DataFrame) -> None:
+        """Apply a batch of farcaster link add/remove events.
+
+        A link whose latest event in the batch has a non-null deleted_at is removed,
+        any other link is added. Batches are expected to be applied in time order.
+        """
+        links_df = links_df[links_df["type"].isin(LINK_TYPE_MAP.keys())]
+        links_df = links_df.sort_values(by="timestamp", ascending=True).drop_duplicates(
+            subset=["fid", "target_fid"], keep="last"
+        )
+        removed = links_df["deleted_at"].notna()
+        self.remove_edges(
+            links_df.loc[removed, "fid"].to_numpy(),
+            links_df.loc[removed, "target_fid"].to_numpy(),
+        )
+        self.add_edges(
+            links_df.loc[~removed, "fid"].to_numpy(),
+            links_df.loc[~removed, "target_fid"].to_numpy(),
+        )
+
+    @property
+    def following_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """CSR ``(indptr, indices)`` of the ids followed by each id."""
+        return self._following.indptr, self._following.pairs & _ID_MASK
+
+    @property
+    def followers_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """CSR ``(indptr, indices)`` of the ids following each id."""
+        return self._followers.indptr, self._followers.pairs & _ID_MASK
+
+    def following(self, fid: int) -> np.ndarray:
+        """Fids followed by the fid."""
+        node = self._lookup(fid)
+        if node < 0:
+            return np.empty(0, dtype=np.int64)
+        return cast(np.ndarray, self._fids[self._following.neighbours(node)])
+
+    def followers(self, fid: int) -> np.ndarray:
+        """Fids following the fid."""
+        node = self._lookup(fid)
+        if node < 0:
+            return np.empty(0, dtype=np.int64)
+        return cast(np.ndarray, self._fids[self._followers.neighbours(node)])
+
+    def follower_counts(self) -> pd.Series:
+        """Number of followers of every fid, indexed by fid."""
+        return pd.Series(np.diff(self._followers.indptr), index=self._fids)
+
+    def following_counts(self) -> pd.Series:
+        """Number of fids followed by every fid, indexed by fid."""
+        return pd.Series(np.diff(self._following.indptr), index=self._fids)
+
+    def two_hop(self, fid: int, *, exclude_following: bool = True) -> pd.Series:
+        """Fids followed by the fids the fid follows, for candidate generation.
+
+        Returns the number of paths to each candidate indexed by fid, in descending
+        order. The fid itself is never a candidate, and the fids it already follows
+        are excluded unless exclude_following is False.
+        """
+        node = self._lookup(fid)
+        if node < 0:
+            return pd.Series([], dtype=np.int64)
+        following = self._following
+        direct = following.neighbours(node)
+        candidates, counts = np.unique(
+            _gather(following.indptr, following.pairs, direct) & _ID_MASK,
+            return_counts=True,
+        )
+        keep = candidates != node
+        if exclude_following:
+            keep &= ~np.isin(candidates, direct, assume_unique=True)
+        return pd.Series(counts[keep], index=self._fids[candidates[keep]]).sort_values(
+            ascending=False, kind="stable"
+        )
@@ -0,0 +1,152 @@
+"""Pipelined ingestion of farcaster casts into items.
+
+The steps of ``get_item_df`` run as stages of ``run_pipeline``, so that reading,
+fetching url metadata, language detection, validation and writing overlap across
+chunks of casts instead of running one after the other:
+
+- read: parquet record batches, advanced in a thread
+- prepare: ``prepare_item_df``
+- fetch: url metadata requests, several chunks in flight on the event loop
+- transform: ``finalize_item_df``, in the given executor, e.g. a process pool
+- validate: ``ITEM_META_SCHEMA``
+- write: one parquet file per chunk, named from the index of the chunk
+
+Chunks travel through the stages with their index in the source, since the fetch
+stage may pass them on out of order.
+"""
+
+import asyncio
+from collections.abc import AsyncIterable, Callable, Iterable, Iterator
+from concurrent.futures import Executor
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+import pandas as pd
+import pyarrow.parquet as pq
+
+from mbd_core.data.farcaster.transform_functions import (
+    FRAME_COLUMN,
+    URL_TEXT_COLUMN,
+    finalize_item_df,
+    prepare_item_df,
+)
+from mbd_core.data.farcaster.utils import aenrich_df_with_url_metadata
+from mbd_core.data.pipeline import (
+    DEFAULT_QUEUE_SIZE,
+    Stage,
+    enumerate_chunks,
+    run_pipeline,
+)
+from mbd_core.data.schema import EMBED_ITEMS_COLUMN, ITEM_COLUMN, ITEM_META_SCHEMA
+
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_FETCH_WORKERS = 4
+
+IndexedChunk = tuple[int, pd.DataFrame]
+
+
+def read_parquet_chunks(
+    path: str | Path, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Read a parquet file as dataframes of at most chunk_rows rows."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def _keep_index(
+    func: Callable[[pd.DataFrame], pd.DataFrame], indexed_chunk: IndexedChunk
+) -> IndexedChunk:
+    """Apply func to the chunk, keeping its index. Module level to be picklable."""
+    index, chunk = indexed_chunk
+    return index, func(chunk)
+
+
+def parquet_chunk_writer(out_dir: str | Path) -> Callable[[IndexedChunk], Path]:
+    """Get a function writing each (index, dataframe) to the part file of index."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(indexed_chunk: IndexedChunk) -> Path:
+        index, chunk_df = indexed_chunk
+        path = out_dir / f"part-{index:05d}.parquet"
+        chunk_df.to_parquet(path, index=False)
+        return path
+
+    return write
+
+
+def get_item_stages(
+    write: Callable[[IndexedChunk], Any],
+    session: aiohttp.ClientSession,
+    executor: Executor | None = None,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    carry_columns: list | None = None,
+) -> list[Stage]:
+    """Get the stages turning chunks of casts into validated items passed to write.
+
+    The stages take and pass on (index, dataframe) pairs, write is called with the
+    index of the chunk of casts and its items.
+
+    session: session of the url metadata requests
+    executor: executor of the language detection, the pipeline executor if None
+    fetch_workers: number of chunks whose url metadata is fetched concurrently
+    """
+
+    async def fetch(indexed_chunk: IndexedChunk) -> IndexedChunk:
+        index, item_df = indexed_chunk
+        return index, await aenrich_df_with_url_metadata(
+            df=item_df,
+            url_column=EMBED_ITEMS_COLUMN,
+            item_id_col=ITEM_COLUMN,
+            enrich_url_text_col=URL_TEXT_COLUMN,
+            enrich_frame_col=FRAME_COLUMN,
+            session=session,
+        )
+
+    return [
+        Stage("prepare", partial(_keep_index, prepare_item_df)),
+        Stage("fetch", fetch, workers=fetch_workers),
+        Stage(
+            "transform",
+            partial(
+                _keep_index, partial(finalize_item_df, carry_columns=carry_columns)
+            ),
+            executor=executor,
+        ),
+        Stage("validate", partial(_keep_index, ITEM_META_SCHEMA.validate)),
+        Stage("write", write),
+    ]
+
+
+async def aingest_casts(
+    chunks: Iterable[pd.DataFrame] | AsyncIterable[pd.DataFrame],
+    write: Callable[[IndexedChunk], Any],
+    executor: Executor | None = None,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> list:
+    """Ingest a stream of casts chunks into items, returning the outputs of write.
+
+    write: called with the index of every chunk of casts and its items
+    """
+    async with aiohttp.ClientSession() as session:
+        stages = get_item_stages(write, session, executor, fetch_workers)
+        return await run_pipeline(enumerate_chunks(chunks), stages, queue_size)
+
+
+def ingest_casts(
+    casts_path: str | Path,
+    out_dir: str | Path,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    executor: Executor | None = None,
+) -> list[Path]:
+    """Ingest a parquet file of casts into parquet files of items in out_dir."""
+    return asyncio.run(
+        aingest_casts(
+            read_parquet_chunks(casts_path, chunk_rows),
+            parquet_chunk_writer(out_dir),
+            executor=executor,
+        )
+    )
@@ -0,0 +1,212 @@
+"""Polars lazy implementation of the farcaster transformation functions.
+
+The functions follow the semantics of ``transform_functions`` and take polars
+DataFrames or LazyFrames. Interactions and users are built as lazy queries. Items
+are collected once to fetch the url metadata and detect the language, since both
+call external code per url or per text.
+"""
+
+import polars as pl
+
+from mbd_core.data.farcaster.transform_functions import (
+    REACT_TYPE_MAP,
+    USER_BIO_TYPE,
+    apply_ftdetect,
+)
+from mbd_core.data.farcaster.utils import URL_PATTERN, enrich_df_with_url_metadata
+from mbd_core.data.schema import (
+    AUTHOR_ID_COLUMN,
+    EDGE_TYPE_COLUMN,
+    EMBED_ITEMS_COLUMN,
+    EMBED_USERS_COLUMN,
+    ITEM_COLUMN,
+    ITEM_CREATION_TIME_COLUMN,
+    ITEM_TEXT_COLUMN,
+    ITEM_UPDATE_TIME_COLUMN,
+    LANG_COLUMN,
+    LANG_SCORE_COLUMN,
+    LIST_COLUMN,
+    PROTOCOL_COLUMN,
+    PROTOCOLS,
+    PUBLICATION_TYPE_COLUMN,
+    PUBLICATION_TYPES,
+    ROOT_ITEM_COLUMN,
+    TIME_COLUMN,
+    USER_COLUMN,
+    USER_CREATION_TIME_COLUMN,
+    USER_PROFILE_COLUMN,
+    USER_UPDATE_TIME_COLUMN,
+)
+
+FrameT = pl.DataFrame | pl.LazyFrame
+
+
+def _timestamp(frame: pl.LazyFrame, col: str) -> pl.Expr:
+    """Expression casting a column to UTC nanosecond timestamps."""
+    dtype = frame.collect_schema()[col]
+    expr = pl.col(col)
+    if dtype == pl.String:
+        expr = expr.str.to_datetime(time_unit="ns")
+        dtype = pl.Datetime("ns")
+    assert isinstance(dtype, pl.Datetime)
+    expr = expr.dt.cast_time_unit("ns")
+    if dtype.time_zone is None:
+        return expr.dt.replace_time_zone("UTC")
+    return expr.dt.convert_time_zone("UTC")
+
+
+def _format_interaction_df(interaction_lf: pl.LazyFrame) -> pl.LazyFrame:
+    return interaction_lf.with_columns(
+        ("0x" + pl.col(ITEM_COLUMN)).alias(ITEM_COLUMN),
+        pl.col(USER_COLUMN).cast(pl.String),
+        pl.lit(PROTOCOLS.farcaster.value).alias(PROTOCOL_COLUMN),
+        _timestamp(interaction_lf, TIME_COLUMN).alias(TIME_COLUMN),
+    )
+
+
+def get_post_comment_interaction_df(casts_df: FrameT) -> pl.LazyFrame:
+    """Get post and comment interactions from casts."""
+    casts_lf = casts_df.lazy()
+    publish_lf = casts_lf.select(
+        pl.col("fid").alias(USER_COLUMN),
+        pl.col("hash").alias(ITEM_COLUMN),
+        pl.col("timestamp").alias(TIME_COLUMN),
+        pl.lit("post").alias(EDGE_TYPE_COLUMN),
+    )
+    comment_lf = casts_lf.filter(pl.col("parent_hash").is_not_null()).select(
+        pl.col("fid").alias(USER_COLUMN),
+        pl.col("parent_hash").alias(ITEM_COLUMN),
+        pl.col("timestamp").alias(TIME_COLUMN),
+        pl.lit("comment").alias(EDGE_TYPE_COLUMN),
+    )
+    return _format_interaction_df(pl.concat([publish_lf, comment_lf]))
+
+
+def get_reaction_df(react_df: FrameT) -> pl.LazyFrame:
+    """Get like and share interactions from reactions."""
+    react_lf = (
+        react_df.lazy()
+        .filter(pl.col("target_hash").is_not_null())
+        .select(
+            pl.col("fid").alias(USER_COLUMN),
+            pl.col("target_hash").alias(ITEM_COLUMN),
+            pl.col("timestamp").alias(TIME_COLUMN),
+            pl.col("reaction_type")
+            .replace_strict(REACT_TYPE_MAP, return_dtype=pl.String)
+            .alias(EDGE_TYPE_COLUMN),
+        )
+    )
+    return _format_interaction_df(react_lf)
+
+
+def get_interaction_df(casts_df: FrameT, react_df: FrameT) -> pl.LazyFrame:
+    """Get interactions from casts and reactions."""
+    return pl.concat(
+        [get_post_comment_interaction_df(casts_df), get_reaction_df(react_df)]
+    )
+
+
+def get_user_df(user_df: FrameT) -> pl.LazyFrame:
+    """Get users from user data messages, keeping the most recent bio per user."""
+    user_lf = user_df.lazy().filter(pl.col("type") == USER_BIO_TYPE)
+    return (
+        user_lf.select(
+            pl.col("fid").cast(pl.String).alias(USER_COLUMN),
+            pl.lit(PROTOCOLS.farcaster.value).alias(PROTOCOL_COLUMN),
+            _timestamp(user_lf, "created_at").alias(USER_CREATION_TIME_COLUMN),
+            _timestamp(user_lf, "timestamp").alias(USER_UPDATE_TIME_COLUMN),
+            pl.col("value").alias(USER_PROFILE_COLUMN),
+        )
+        .sort(USER_UPDATE_TIME_COLUMN, maintain_order=True)
+        .unique(subset=USER_COLUMN, keep="last", maintain_order=True)
+    )
+
+
+def _detect_lang(text: pl.Series) -> pl.Series:
+    langs, scores = (
+        zip(*map(apply_ftdetect, text), strict=True) if len(text) else ((), ())
+    )
+    return pl.DataFrame(
+        {LANG_COLUMN: list(langs), LANG_SCORE_COLUMN: list(scores)},
+        schema={LANG_COLUMN: pl.String, LANG_SCORE_COLUMN: pl.Float64},
+    ).to_struct()
+
+
+def get_item_df(casts_df: FrameT, carry_columns: list | None = None) -> pl.LazyFrame:
+    """Get items from casts."""
+    casts_lf = casts_df.lazy()
+    item_df = (
+        casts_lf.unique(subset="hash", keep="first", maintain_order=True)
+        .with_columns(
+            ("0x" + pl.col("hash")).alias(ITEM_COLUMN),
+            pl.col("fid").cast(pl.String).alias(AUTHOR_ID_COLUMN),
+            pl.lit(PROTOCOLS.farcaster.value).alias(PROTOCOL_COLUMN),
+            _timestamp(casts_lf, "timestamp").alias(ITEM_CREATION_TIME_COLUMN),
+            _timestamp(casts_lf, "timestamp").alias(ITEM_UPDATE_TIME_COLUMN),
+            pl.when(pl.col("parent_hash").is_null())
+            .then(pl.lit("root"))
+            .otherwise("0x" + pl.col("root_parent_hash"))
+            .alias(ROOT_ITEM_COLUMN),
+            pl.col("text").str.extract_all(URL_PATTERN).alias(EMBED_ITEMS_COLUMN),
+        )
+        .collect()
+    )
+
+    # enrich url metadata, only the items with urls are sent to the pandas helper
+    url_df = item_df.select(ITEM_COLUMN, EMBED_ITEMS_COLUMN).filter(
+        pl.col(EMBED_ITEMS_COLUMN).list.len() > 0
+    )
+    enriched_df = enrich_df_with_url_metadata(
+        df=url_df.to_pandas(),
+        url_column=EMBED_ITEMS_COLUMN,
+        item_id_col=ITEM_COLUMN,
+        enrich_url_text_col="_url_text",
+        enrich_frame_col="_frame",
+    )
+    item_df = item_df.join(
+        pl.from_pandas(enriched_df[[ITEM_COLUMN, "_url_text", "_frame"]]).cast(
+            {"_url_text": pl.String, "_frame": pl.Boolean}
+        ),
+        on=ITEM_COLUMN,
+        how="left",
+    ).with_columns(
+        pl.concat_str(
+            [pl.col("text"), pl.lit(". "), pl.col("_url_text").fill_null("")]
+        ).alias("text"),
+        pl.col("_frame").fill_null(value=False),
+    )
+
+    item_df = item_df.with_columns(
+        pl.struct(pl.col("text").alias("full"), pl.col("text").alias("summary")).alias(
+            ITEM_TEXT_COLUMN
+        ),
+        pl.when(pl.col("_frame"))
+        .then(pl.lit(PUBLICATION_TYPES.frame.value))
+        .otherwise(pl.lit(PUBLICATION_TYPES.text_only.value))
+        .alias(PUBLICATION_TYPE_COLUMN),
+        _detect_lang(item_df["text"]).alias("_lang_res"),
+        pl.when(pl.col("root_parent_url").is_not_null())
+        .then(pl.concat_list(pl.col("root_parent_url")))
+        .otherwise(pl.lit([], dtype=pl.List(pl.String)))
+        .alias(LIST_COLUMN),
+        pl.col("mentions").cast(pl.List(pl.String)).alias(EMBED_USERS_COLUMN),
+    ).unnest("_lang_res")
+
+    selected_columns = [
+        ITEM_COLUMN,
+        AUTHOR_ID_COLUMN,
+        PROTOCOL_COLUMN,
+        ITEM_CREATION_TIME_COLUMN,
+        ITEM_UPDATE_TIME_COLUMN,
+        ITEM_TEXT_COLUMN,
+        PUBLICATION_TYPE_COLUMN,
+        ROOT_ITEM_COLUMN,
+        LANG_COLUMN,
+        LANG_SCORE_COLUMN,
+        LIST_COLUMN,
+        EMBED_ITEMS_COLUMN,
+        EMBED_USERS_COLUMN,
+    ]
+    if carry_columns:  # pragma: no cover
+        selected_columns += carry_columns
+    return item_df.lazy().select(selected_columns)
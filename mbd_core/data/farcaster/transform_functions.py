@@ -1,12 +1,14 @@
 """Transformation functions for farcaster data."""
 
-import re
-
-import pandas as pd  # comment this line if you want to use modin
+import pandas as pd
 from ftlangdetect import detect as ftdetect
 from pandas.api.types import is_datetime64_ns_dtype
 
-from mbd_core.data.farcaster.utils import enrich_df_with_url_metadata
+from mbd_core.data.farcaster.utils import (
+    enrich_df_with_url_metadata,
+    extract_urls,
+    get_dataframe_module,
+)
 from mbd_core.data.schema import (
     AUTHOR_ID_COLUMN,
     EDGE_TYPE_COLUMN,
@@ -25,14 +27,23 @@ from mbd_core.data.schema import (
     PUBLICATION_TYPES,
     ROOT_ITEM_COLUMN,
     TIME_COLUMN,
+    USER1_COLUMN,
+    USER2_COLUMN,
     USER_COLUMN,
     USER_CREATION_TIME_COLUMN,
+    USER_INTERACTION_TIME_COLUMN,
+    USER_INTERACTION_TYPE_COLUMN,
+    USER_INTERACTION_TYPES,
     USER_PROFILE_COLUMN,
     USER_UPDATE_TIME_COLUMN,
 )
 
 REACT_TYPE_MAP = {1: "like", 2: "share"}
 USER_BIO_TYPE = 3
+LINK_TYPE_MAP = {"follow": USER_INTERACTION_TYPES.follow.value}
+# temporary columns holding the url metadata between prepare and finalize
+URL_TEXT_COLUMN = "_url_text"
+FRAME_COLUMN = "_frame"
 
 
 def apply_ftdetect(text: str) -> tuple[str, float]:
@@ -52,15 +63,13 @@ def derive_root_item_column(item_df: pd.DataFrame) -> pd.DataFrame:
 
 def _format_timestamp(df: pd.DataFrame, col: str) -> None:  # pragma: no cover
     if not is_datetime64_ns_dtype(df[col]):
-        df[col] = pd.to_datetime(df[col])
+        df[col] = get_dataframe_module(df).to_datetime(df[col])
     if df[col].dt.tz is None:
         df[col] = df[col].dt.tz_localize("UTC")
 
 
-def get_item_df(
-    casts_df: pd.DataFrame, carry_columns: list | None = None
-) -> pd.DataFrame:
-    """Get item dataframe from casts dataframe."""
+def prepare_item_df(casts_df: pd.DataFrame) -> pd.DataFrame:
+    """Map casts to the item schema and extract their urls, before url enrichment."""
     item_df = casts_df.copy()
     item_df = item_df.drop_duplicates(subset=["hash"]).reset_index(drop=True)
 
@@ -72,26 +81,24 @@ def get_item_df(
     item_df[ITEM_UPDATE_TIME_COLUMN] = item_df["timestamp"]
     item_df = derive_root_item_column(item_df)
 
-    # enrich url metadata
-    item_df[EMBED_ITEMS_COLUMN] = item_df["text"].apply(
-        lambda txt: re.findall(r"https?://\S+", txt)
-    )
+    item_df[EMBED_ITEMS_COLUMN] = extract_urls(item_df["text"])
+    return item_df
 
-    item_df = enrich_df_with_url_metadata(
-        df=item_df,
-        url_column=EMBED_ITEMS_COLUMN,
-        item_id_col=ITEM_COLUMN,
-        enrich_url_text_col="_url_text",
-        enrich_frame_col="_frame",
+
+def finalize_item_df(
+    item_df: pd.DataFrame, carry_columns: list | None = None
+) -> pd.DataFrame:
+    """Build the items from casts enriched with url metadata, detecting languages."""
+    item_df["text"] = item_df["text"].str.cat(
+        item_df[URL_TEXT_COLUMN], sep=". ", na_rep=""
     )
-    item_df["text"] = item_df["text"].str.cat(item_df["_url_text"], sep=". ", na_rep="")
 
     # clean text
     item_df[ITEM_TEXT_COLUMN] = item_df["text"].apply(
         lambda x: {"full": x, "summary": x}
     )
     item_df[PUBLICATION_TYPE_COLUMN] = PUBLICATION_TYPES.text_only.value
-    item_df.loc[item_df["_frame"], PUBLICATION_TYPE_COLUMN] = (
+    item_df.loc[item_df[FRAME_COLUMN], PUBLICATION_TYPE_COLUMN] = (
         PUBLICATION_TYPES.frame.value
     )
     item_df["_lang_res"] = item_df[ITEM_TEXT_COLUMN].apply(
@@ -131,6 +138,21 @@ def get_item_df(
     return item_df
 
 
+def get_item_df(
+    casts_df: pd.DataFrame, carry_columns: list | None = None
+) -> pd.DataFrame:
+    """Get item dataframe from casts dataframe."""
+    item_df = prepare_item_df(casts_df)
+    item_df = enrich_df_with_url_metadata(
+        df=item_df,
+        url_column=EMBED_ITEMS_COLUMN,
+        item_id_col=ITEM_COLUMN,
+        enrich_url_text_col=URL_TEXT_COLUMN,
+        enrich_frame_col=FRAME_COLUMN,
+    )
+    return finalize_item_df(item_df, carry_columns)
+
+
 def _format_interaction_df(interaction_df: pd.DataFrame) -> pd.DataFrame:
     interaction_df[ITEM_COLUMN] = "0x" + interaction_df[ITEM_COLUMN]
     interaction_df[USER_COLUMN] = interaction_df[USER_COLUMN].astype(str)
@@ -163,7 +185,9 @@ def get_post_comment_interaction_df(casts_df: pd.DataFrame) -> pd.DataFrame:
     )
     comment_df[EDGE_TYPE_COLUMN] = "comment"
 
-    return _format_interaction_df(pd.concat([publish_df, comment_df]))
+    return _format_interaction_df(
+        get_dataframe_module(casts_df).concat([publish_df, comment_df])
+    )
 
 
 def get_reaction_df(react_df: pd.DataFrame) -> pd.DataFrame:
@@ -191,7 +215,11 @@ def get_interaction_df(
     """Get interaction dataframe from casts and reaction dataframe."""
     post_comment_interaction_df = get_post_comment_interaction_df(casts_df)
     reaction_df = get_reaction_df(react_df)
-    return pd.concat([post_comment_interaction_df, reaction_df]).reset_index(drop=True)
+    return (
+        get_dataframe_module(casts_df)
+        .concat([post_comment_interaction_df, reaction_df])
+        .reset_index(drop=True)
+    )
 
 
 def get_user_df(user_df: pd.DataFrame) -> pd.DataFrame:
@@ -199,9 +227,11 @@ def get_user_df(user_df: pd.DataFrame) -> pd.DataFrame:
     user_df = user_df[user_df["type"] == USER_BIO_TYPE].copy()
     user_df[USER_COLUMN] = user_df["fid"].astype(str)
     user_df[PROTOCOL_COLUMN] = PROTOCOLS.farcaster.value
-    user_df[USER_CREATION_TIME_COLUMN] = pd.to_datetime(
-        user_df["created_at"]
-    ).dt.tz_localize("UTC")
+    user_df[USER_CREATION_TIME_COLUMN] = (
+        get_dataframe_module(user_df)
+        .to_datetime(user_df["created_at"])
+        .dt.tz_localize("UTC")
+    )
     user_df[USER_UPDATE_TIME_COLUMN] = user_df["timestamp"]
     user_df[USER_PROFILE_COLUMN] = user_df["value"]
     user_df = user_df[
@@ -220,3 +250,28 @@ def get_user_df(user_df: pd.DataFrame) -> pd.DataFrame:
         .drop_duplicates(subset=USER_COLUMN, keep="last")
         .reset_index(drop=True)
     )
+
+
+def get_user_interaction_df(links_df: pd.DataFrame) -> pd.DataFrame:
+    """Get user interaction dataframe from links dataframe.
+
+    Only the latest event of each link is kept, and links removed by that event,
+    i.e. with a non-null deleted_at, are dropped.
+    """
+    links_df = links_df[links_df["type"].isin(LINK_TYPE_MAP.keys())]
+    links_df = links_df.sort_values(by="timestamp", ascending=True).drop_duplicates(
+        subset=["fid", "target_fid", "type"], keep="last"
+    )
+    links_df = links_df[links_df["deleted_at"].isna()]
+
+    user_interaction_df = get_dataframe_module(links_df).DataFrame(
+        {
+            USER1_COLUMN: links_df["fid"].astype(str),
+            USER2_COLUMN: links_df["target_fid"].astype(int).astype(str),
+            USER_INTERACTION_TIME_COLUMN: links_df["timestamp"],
+            USER_INTERACTION_TYPE_COLUMN: links_df["type"].map(LINK_TYPE_MAP),
+            PROTOCOL_COLUMN: PROTOCOLS.farcaster.value,
+        }
+    )
+    _format_timestamp(user_interaction_df, USER_INTERACTION_TIME_COLUMN)
+    return user_interaction_df.reset_index(drop=True)
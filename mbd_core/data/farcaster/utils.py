@@ -1,10 +1,13 @@
 """Utility functions for farcaster data processing."""
 
 import asyncio
+import importlib
 import json
 import re
 import time
-from typing import cast
+from types import ModuleType
+from typing import Any, cast
+from urllib.parse import urlsplit, urlunsplit
 
 import aiohttp
 import emoji
@@ -15,6 +18,32 @@ EMBEDS_METADATA_URL = "https://api.modprotocol.org/api/cast-embeds-metadata/by-u
 
 MIN_TEXT_LENGTH = 20
 
+# urls end at their last character that is neither a whitespace nor punctuation.
+# Parentheses are only part of urls in balanced pairs, e.g. in
+# https://en.wikipedia.org/wiki/A_(b), while "(https://a.com)" gives https://a.com
+URL_PATTERN = r"https?://(?:\([^\s()]*\)|[^\s()])*(?:\([^\s()]*\)|[^\s.,;:!?'\"()\]}>])"
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "ref_src",
+    "_ga",
+    "_gl",
+}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def get_dataframe_module(df: Any) -> ModuleType:
+    """Get the pandas compatible module of a dataframe, e.g. modin.pandas for modin."""
+    if type(df).__module__.startswith("modin."):
+        return importlib.import_module("modin.pandas")
+    return cast(ModuleType, pd)
+
 
 def filter_text(text: str) -> bool:
     """Filter text based on length at least larger than 20."""
@@ -57,6 +86,52 @@ def clean_text(item_df: pd.DataFrame, text_col: str, time_col: str) -> pd.DataFr
     )
 
 
+def extract_urls(text: pd.Series) -> pd.Series:
+    """Extract the urls of every text in the column, without trailing punctuation."""
+    urls = text.str.findall(URL_PATTERN)
+    missing = urls.isna()
+    if missing.any():
+        urls[missing] = get_dataframe_module(text).Series(
+            [[] for _ in range(missing.sum())], index=urls.index[missing]
+        )
+    return urls
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonicalize an url to dedup the urls pointing to the same page.
+
+    Scheme and host are lowercased, default ports, tracking query parameters and
+    the fragment are dropped.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    userinfo, at, host = parts.netloc.rpartition("@")
+    host = host.lower()
+    if port is not None and port == DEFAULT_PORTS.get(scheme):
+        host = host.rsplit(":", 1)[0]
+    query = "&".join(
+        param
+        for param in parts.query.split("&")
+        if param and not _is_tracking_param(param.split("=", 1)[0])
+    )
+    return urlunsplit((scheme, f"{userinfo}{at}{host}", parts.path or "/", query, ""))
+
+
+def canonicalize_urls(urls: pd.Series) -> pd.Series:
+    """Canonicalize a column of urls, processing each distinct url only once."""
+    unique_urls = urls.dropna().unique()
+    return urls.map({url: canonicalize_url(url) for url in unique_urls})
+
+
 async def get_urls_metadata(urls: list[str], session: aiohttp.ClientSession) -> dict:
     """Get metadata for a list of urls."""
     params = json.dumps(urls)
@@ -99,37 +174,57 @@ def _get_url_enrichment(
     return pd.Series({enrich_url_text_col: cat_url_text, enrich_frame_col: frame})
 
 
-def enrich_df_with_url_metadata(  # noqa: PLR0913
-    df: pd.DataFrame,
-    url_column: str,
-    item_id_col: str,
-    enrich_url_text_col: str,
-    enrich_frame_col: str,
-    batch_size: int = 100,
+def explode_urls(
+    df: pd.DataFrame, url_column: str, item_id_col: str, *, canonicalize: bool = True
 ) -> pd.DataFrame:
-    """Enrich dataframe with url metadata.
+    """Explode the url lists into one row per item and url, keyed by "_url_key".
 
-    df: the dataframe
-    url_column: the column name contains urls. Each value of the column is a list of urls
+    canonicalize: key the urls by their canonical url, so that the metadata of each
+        canonical url is fetched once for all the original urls pointing to it
     """
     exploded_df = df.explode(url_column)[[item_id_col, url_column]].dropna(
         subset=[url_column]
     )
-    target_urls = exploded_df[url_column].unique().tolist()
-    results = asyncio.run(
-        get_urls_list_metadata(
-            [
-                target_urls[i : i + batch_size]
-                for i in range(0, len(target_urls), batch_size)
-            ]
-        )
+    exploded_df["_url_key"] = (
+        canonicalize_urls(exploded_df[url_column])
+        if canonicalize
+        else exploded_df[url_column]
     )
-    # merge url meta
+    return exploded_df
+
+
+async def fetch_urls_metadata(
+    urls: list[str],
+    batch_size: int = 100,
+    session: aiohttp.ClientSession | None = None,
+) -> dict:
+    """Get the metadata of urls, requested in concurrent batches of batch_size urls."""
+    batches = [urls[i : i + batch_size] for i in range(0, len(urls), batch_size)]
+    if session is None:
+        results = await get_urls_list_metadata(batches)
+    else:
+        results = await asyncio.gather(
+            *[get_urls_metadata(batch, session) for batch in batches]
+        )
     merged_dict = {}
     for d in results:
         merged_dict.update(d)
+    return merged_dict
+
+
+def join_url_metadata(  # noqa: PLR0913
+    df: pd.DataFrame,
+    exploded_df: pd.DataFrame,
+    metadata: dict,
+    item_id_col: str,
+    enrich_url_text_col: str,
+    enrich_frame_col: str,
+) -> pd.DataFrame:
+    """Enrich dataframe with the metadata of its exploded urls."""
     exploded_df = exploded_df.join(
-        pd.Series(merged_dict, name="url_meta"), on=url_column, how="left"
+        get_dataframe_module(df).Series(metadata, name="url_meta"),
+        on="_url_key",
+        how="left",
     ).dropna(subset=["url_meta"])
 
     # agg based on item_id
@@ -157,3 +252,53 @@ def enrich_df_with_url_metadata(  # noqa: PLR0913
         enriched_df[enrich_url_text_col] = ""
         enriched_df[enrich_frame_col] = False
     return enriched_df
+
+
+def enrich_df_with_url_metadata(  # noqa: PLR0913
+    df: pd.DataFrame,
+    url_column: str,
+    item_id_col: str,
+    enrich_url_text_col: str,
+    enrich_frame_col: str,
+    batch_size: int = 100,
+    *,
+    canonicalize: bool = True,
+) -> pd.DataFrame:
+    """Enrich dataframe with url metadata.
+
+    df: the dataframe
+    url_column: the column name contains urls. Each value of the column is a list of urls
+    canonicalize: fetch the metadata of each canonical url once and map it back to
+        all the original urls with the same canonical url
+    """
+    exploded_df = explode_urls(df, url_column, item_id_col, canonicalize=canonicalize)
+    metadata = asyncio.run(
+        fetch_urls_metadata(exploded_df["_url_key"].unique().tolist(), batch_size)
+    )
+    return join_url_metadata(
+        df, exploded_df, metadata, item_id_col, enrich_url_text_col, enrich_frame_col
+    )
+
+
+async def aenrich_df_with_url_metadata(  # noqa: PLR0913
+    df: pd.DataFrame,
+    url_column: str,
+    item_id_col: str,
+    enrich_url_text_col: str,
+    enrich_frame_col: str,
+    batch_size: int = 100,
+    *,
+    canonicalize: bool = True,
+    session: aiohttp.ClientSession | None = None,
+) -> pd.DataFrame:
+    """Async enrich_df_with_url_metadata, to fetch urls inside a running event loop.
+
+    session: session to send the requests with, a new one is opened if None
+    """
+    exploded_df = explode_urls(df, url_column, item_id_col, canonicalize=canonicalize)
+    metadata = await fetch_urls_metadata(
+        exploded_df["_url_key"].unique().tolist(), batch_size, session
+    )
+    return join_url_metadata(
+        df, exploded_df, metadata, item_id_col, enrich_url_text_col, enrich_frame_col
+    )
@@ -0,0 +1,294 @@
+"""Inverted indexes over the list columns of items.
+
+An ``InvertedIndex`` maps the values of ``LIST_COLUMN`` (channels),
+``EMBED_ITEMS_COLUMN`` (urls) and ``EMBED_USERS_COLUMN`` (mentions) to the items
+containing them, without exploding the item frame at query time:
+
+- item ids and keys are interned to integers, with mappings grown in place
+- each column holds, per key, its item integer ids sorted ascending, to intersect
+  postings with binary searches, and sorted from the most recent item, for
+  recency queries
+- appended item batches are buffered and merged into the postings lazily, when
+  the index is read: the new (key, item) pairs are inserted with binary searches
+  and only the recency order of the keys they touch is sorted again
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.schema import (
+    EMBED_ITEMS_COLUMN,
+    EMBED_USERS_COLUMN,
+    ITEM_COLUMN,
+    ITEM_CREATION_TIME_COLUMN,
+    LIST_COLUMN,
+)
+from mbd_core.utils import to_unix_seconds
+
+INDEXED_COLUMNS = (LIST_COLUMN, EMBED_ITEMS_COLUMN, EMBED_USERS_COLUMN)
+MIN_CAPACITY = 1024
+
+_DOC_BITS = np.int64(32)
+_DOC_MASK = np.int64(0xFFFFFFFF)
+
+
+def _empty_postings() -> np.ndarray:
+    return np.zeros(0, dtype=np.int64)
+
+
+def _intern(mapping: dict[str, int], values: pd.Series) -> np.ndarray:
+    """Integer ids of the values, adding the values missing from the mapping."""
+    codes, uniques = pd.factorize(values)
+    ids = np.fromiter(
+        (mapping.setdefault(value, len(mapping)) for value in uniques),
+        dtype=np.int64,
+        count=len(uniques),
+    )
+    return cast(np.ndarray, ids[codes])
+
+
+def _ranges(offsets: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Positions of the CSR segments of the given keys, concatenated."""
+    starts = offsets[keys]
+    lengths = offsets[keys + 1] - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(
+        lengths.sum()
+    )
+
+
+@dataclass
+class _Postings:
+    key_ids: dict[str, int] = field(default_factory=dict)
+    offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    # sorted encoded (key, doc) pairs
+    pairs: np.ndarray = field(default_factory=_empty_postings)
+    recent: np.ndarray = field(default_factory=_empty_postings)
+    pending: list[np.ndarray] = field(default_factory=list)
+    recent_stale: bool = False
+
+    def compact(self, seconds: np.ndarray) -> None:
+        """Merge the pending (key, doc) pairs into the postings."""
+        if not self.pending and not self.recent_stale:
+            return
+        old_offsets = self.offsets
+        touched = self._merge_pending()
+        if self.recent_stale:
+            touched = np.arange(len(self.offsets) - 1)
+            self.recent_stale = False
+        self._sort_recent(seconds, old_offsets, touched)
+
+    def _merge_pending(self) -> np.ndarray:
+        """Insert the pending pairs, returning the keys that got new docs."""
+        if not self.pending:
+            return _empty_postings()
+        new_pairs = np.unique(np.concatenate(self.pending))
+        self.pending = []
+        positions = np.searchsorted(self.pairs, new_pairs)
+        found = positions < len(self.pairs)
+        found[found] = self.pairs[positions[found]] == new_pairs[found]
+        new_pairs, positions = new_pairs[~found], positions[~found]
+        counts = np.bincount(new_pairs >> _DOC_BITS, minlength=len(self.key_ids))
+        lengths = np.diff(self.offsets)
+        counts[: len(lengths)] += lengths
+        self.offsets = np.zeros(len(self.key_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.pairs = np.insert(self.pairs, positions, new_pairs)
+        return cast(np.ndarray, np.unique(new_pairs >> _DOC_BITS))
+
+    def _sort_recent(
+        self, seconds: np.ndarray, old_offsets: np.ndarray, touched: np.ndarray
+    ) -> None:
+        """Sort the touched keys most recent first, copying the order of the others."""
+        recent = np.empty(len(self.pairs), dtype=np.int64)
+        untouched = np.setdiff1d(
+            np.arange(len(old_offsets) - 1), touched, assume_unique=True
+        )
+        recent[_ranges(self.offsets, untouched)] = self.recent[
+            _ranges(old_offsets, untouched)
+        ]
+        touched_pairs = self.pairs[_ranges(self.offsets, touched)]
+        docs = touched_pairs & _DOC_MASK
+        # the last appended first among items of the same time
+        order = np.lexsort((-docs, -seconds[docs], touched_pairs >> _DOC_BITS))
+        recent[_ranges(self.offsets, touched)] = docs[order]
+        self.recent = recent
+
+    def slice_of(self, key: str) -> slice:
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            return slice(0, 0)
+        return slice(self.offsets[key_id], self.offsets[key_id + 1])
+
+
+class InvertedIndex:
+    """Inverted index from the values of item list columns to items."""
+
+    def __init__(self, columns: Sequence[str] = INDEXED_COLUMNS) -> None:
+        """Create an empty index of the given list columns."""
+        self.columns = list(columns)
+        self._items: dict[str, int] = {}
+        self._item_ids = np.empty(0, dtype=object)
+        self._seconds = np.zeros(0, dtype=np.int64)
+        self._postings = {column: _Postings() for column in self.columns}
+
+    @property
+    def num_items(self) -> int:
+        """Number of items indexed."""
+        return len(self._items)
+
+    def _reserve(self, n_items: int) -> None:
+        """Grow the per-item arrays geometrically to hold at least n_items."""
+        capacity = len(self._seconds)
+        if n_items <= capacity:
+            return
+        new_capacity = max(n_items, 2 * capacity, MIN_CAPACITY)
+        item_ids = np.empty(new_capacity, dtype=object)
+        item_ids[:capacity] = self._item_ids
+        seconds = np.zeros(new_capacity, dtype=np.int64)
+        seconds[:capacity] = self._seconds
+        self._item_ids, self._seconds = item_ids, seconds
+
+    def _intern_items(self, item_df: pd.DataFrame) -> np.ndarray:
+        """Integer ids of the items, storing their latest creation time."""
+        n_before = self.num_items
+        doc_ids = _intern(self._items, item_df[ITEM_COLUMN])
+        self._reserve(self.num_items)
+        self._item_ids[doc_ids] = item_df[ITEM_COLUMN].to_numpy()
+        seconds = to_unix_seconds(item_df[ITEM_CREATION_TIME_COLUMN])
+        existing = doc_ids < n_before
+        if (self._seconds[doc_ids[existing]] != seconds[existing]).any():
+            # the recency order of keys outside of the batch changes too
+            for postings in self._postings.values():
+                postings.recent_stale = True
+        self._seconds[doc_ids] = seconds
+        return doc_ids
+
+    def append(self, item_df: pd.DataFrame) -> None:
+        """Index a batch of items following ITEM_META_SCHEMA.
+
+        Items already indexed keep their ids and get the keys of the batch added.
+        """
+        if item_df.empty:
+            return
+        doc_ids = self._intern_items(item_df)
+        for column in self.columns:
+            if column not in item_df:
+                continue
+            exploded_df = (
+                pd.DataFrame({"_doc": doc_ids, column: item_df[column].to_numpy()})
+                .explode(column)
+                .dropna(subset=[column])
+            )
+            postings = self._postings[column]
+            key_ids = _intern(postings.key_ids, exploded_df[column])
+            postings.pending.append(
+                (key_ids << _DOC_BITS) | exploded_df["_doc"].to_numpy(dtype=np.int64)
+            )
+
+    def _get_postings(self, column: str) -> _Postings:
+        if column not in self._postings:
+            msg = f"Column {column} is not indexed, expected one of {self.columns}"
+            raise KeyError(msg)
+        postings = self._postings[column]
+        postings.compact(self._seconds)
+        return postings
+
+    def keys(self, column: str) -> pd.Series:
+        """Number of items per key of a column."""
+        postings = self._get_postings(column)
+        return pd.Series(
+            np.diff(postings.offsets),
+            index=pd.Index(list(postings.key_ids), dtype=object),
+            name=column,
+        )
+
+    def postings(self, column: str, key: str) -> np.ndarray:
+        """Sorted integer ids of the items with key in column."""
+        postings = self._get_postings(column)
+        return postings.pairs[postings.slice_of(key)] & _DOC_MASK
+
+    def items(self, column: str, key: str) -> np.ndarray:
+        """Ids of the items with key in column."""
+        return self.item_ids(self.postings(column, key))
+
+    def item_ids(self, docs: np.ndarray) -> np.ndarray:
+        """Item ids of integer item ids."""
+        return np.asarray(self._item_ids[docs])
+
+    def intersect(self, terms: Sequence[tuple[str, str]]) -> np.ndarray:
+        """Ids of the items matching all (column, key) terms.
+
+        Postings are intersected from the shortest, looking up each remaining
+        id in the longer postings with a binary search.
+        """
+        postings = sorted(
+            (self.postings(column, key) for column, key in terms), key=len
+        )
+        if not postings:
+            return self.item_ids(_empty_postings())
+        docs = postings[0]
+        for other in postings[1:]:
+            if not len(docs):
+                break
+            # other is not empty, since it is at least as long as docs
+            positions = np.searchsorted(other, docs).clip(max=len(other) - 1)
+            docs = docs[other[positions] == docs]
+        return self.item_ids(docs)
+
+    def recent(
+        self,
+        column: str,
+        key: str,
+        n: int = 10,
+        before: pd.Timestamp | None = None,
+    ) -> np.ndarray:
+        """Ids of the n most recent items with key in column.
+
+        before: only items created strictly before this time
+        """
+        postings = self._get_postings(column)
+        docs = postings.recent[postings.slice_of(key)]
+        if before is not None:
+            docs = docs[self._seconds[docs] < pd.Timestamp(before).timestamp()]
+        return self.item_ids(docs[:n])
+
+    def save(self, path: str | Path) -> None:
+        """Save the index to a .npz file, the extension is added if missing."""
+        arrays = {
+            "columns": np.asarray(self.columns, dtype=str),
+            "items": np.asarray(self._item_ids[: self.num_items], dtype=str),
+            "seconds": self._seconds[: self.num_items],
+        }
+        for i, column in enumerate(self.columns):
+            postings = self._get_postings(column)
+            arrays[f"keys_{i}"] = np.asarray(list(postings.key_ids), dtype=str)
+            arrays[f"offsets_{i}"] = postings.offsets
+            arrays[f"docs_{i}"] = postings.pairs & _DOC_MASK
+            arrays[f"recent_{i}"] = postings.recent
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "InvertedIndex":
+        """Load an index saved with save."""
+        with np.load(path) as arrays:
+            index = cls(columns=arrays["columns"].tolist())
+            items = arrays["items"].tolist()
+            index._items = {item: doc for doc, item in enumerate(items)}
+            index._item_ids = np.asarray(items, dtype=object)
+            index._seconds = arrays["seconds"]
+            for i, column in enumerate(index.columns):
+                keys = arrays[f"keys_{i}"].tolist()
+                offsets = arrays[f"offsets_{i}"]
+                key_ids = np.repeat(np.arange(len(keys)), np.diff(offsets))
+                index._postings[column] = _Postings(
+                    key_ids={key: key_id for key_id, key in enumerate(keys)},
+                    offsets=offsets,
+                    pairs=(key_ids << _DOC_BITS) | arrays[f"docs_{i}"],
+                    recent=arrays[f"recent_{i}"],
+                )
+        return index
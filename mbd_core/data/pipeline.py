@@ -0,0 +1,181 @@
+"""Pipelined processing of a stream of chunks with asyncio.
+
+A pipeline is a list of stages connected by bounded queues. Every stage processes
+its own chunk at the same time as the other stages, e.g. the url metadata of one
+chunk is fetched while the previous chunk is in language detection and the one
+before is written. A full queue blocks its producer, so a slow stage throttles the
+stages before it instead of piling up chunks in memory.
+
+Stage functions may be coroutine functions, which run on the event loop, or plain
+functions. Blocking plain functions run in an executor so they do not stall the
+loop. Give CPU-bound stages a ``ProcessPoolExecutor``, their functions and chunks
+must then be picklable.
+"""
+
+import asyncio
+import inspect
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A step of a pipeline.
+
+    name: name of the stage, used in error messages
+    func: function applied to every chunk, sync or async
+    workers: number of chunks processed concurrently by the stage, chunks may
+        leave a stage with several workers out of order
+    blocking: run a sync func in an executor instead of on the event loop
+    executor: executor of the stage, the executor of the pipeline if None
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    blocking: bool = True
+    executor: Executor | None = None
+
+
+class StageError(Exception):
+    """Error raised by a stage function, with the stage and the chunk index."""
+
+    def __init__(self, stage: str, index: int) -> None:
+        """Create the error of the chunk at index in stage."""
+        super().__init__(f"Stage {stage} failed on chunk {index}")
+        self.stage = stage
+        self.index = index
+
+
+async def _aenumerate(source: AsyncIterable) -> AsyncIterator[tuple[int, Any]]:
+    index = 0
+    async for chunk in source:
+        yield index, chunk
+        index += 1
+
+
+def enumerate_chunks(
+    source: Iterable | AsyncIterable,
+) -> Iterable[tuple[int, Any]] | AsyncIterable[tuple[int, Any]]:
+    """Pair the chunks of a sync or async source with their index.
+
+    For stages that need the source index of their chunk, e.g. to name output
+    files, since chunks may leave stages with several workers out of order.
+    """
+    if isinstance(source, AsyncIterable):
+        return _aenumerate(source)
+    return enumerate(source)
+
+
+async def _feed(source: Iterable | AsyncIterable, queue: asyncio.Queue) -> None:
+    if isinstance(source, AsyncIterable):
+        index = 0
+        async for chunk in source:
+            await queue.put((index, chunk))
+            index += 1
+        return
+    # sync sources, e.g. parquet readers, are advanced in a thread
+    loop = asyncio.get_running_loop()
+    iterator = iter(source)
+    index = 0
+    while True:
+        chunk = await loop.run_in_executor(None, next, iterator, _DONE)
+        if chunk is _DONE:
+            return
+        await queue.put((index, chunk))
+        index += 1
+
+
+async def _work(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    executor: Executor | None,
+) -> None:
+    loop = asyncio.get_running_loop()
+    executor = stage.executor or executor
+    is_async = inspect.iscoroutinefunction(stage.func)
+    while True:
+        item = await inbox.get()
+        if item is _DONE:
+            # leave the marker for the other workers of the stage
+            await inbox.put(_DONE)
+            return
+        index, chunk = item
+        try:
+            if is_async:
+                result = await stage.func(chunk)
+            elif stage.blocking:
+                result = await loop.run_in_executor(executor, stage.func, chunk)
+            else:
+                result = stage.func(chunk)
+        except Exception as e:
+            raise StageError(stage.name, index) from e
+        await outbox.put((index, result))
+
+
+async def _run_stage(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    executor: Executor | None,
+) -> None:
+    await asyncio.gather(
+        *[_work(stage, inbox, outbox, executor) for _ in range(stage.workers)]
+    )
+    await outbox.put(_DONE)
+
+
+async def run_pipeline(
+    source: Iterable | AsyncIterable,
+    stages: list[Stage],
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    executor: Executor | None = None,
+) -> list:
+    """Run chunks from source through the stages, concurrently across chunks.
+
+    source: chunks to process, a sync or async iterable
+    stages: stages applied in order to every chunk
+    queue_size: maximum number of chunks waiting in front of each stage
+    executor: executor of the blocking stages without their own executor, the
+        default executor of the loop if None
+
+    Returns the outputs of the last stage, in the order of the source chunks.
+    Raises StageError if a stage fails, after cancelling the other stages.
+    """
+    queues: list[asyncio.Queue] = [
+        asyncio.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)
+    ]
+
+    async def feed() -> None:
+        await _feed(source, queues[0])
+        await queues[0].put(_DONE)
+
+    results: dict[int, Any] = {}
+
+    async def collect() -> None:
+        while (item := await queues[-1].get()) is not _DONE:
+            index, result = item
+            results[index] = result
+
+    tasks = [
+        asyncio.ensure_future(feed()),
+        *[
+            asyncio.ensure_future(_run_stage(stage, queues[i], queues[i + 1], executor))
+            for i, stage in enumerate(stages)
+        ],
+        asyncio.ensure_future(collect()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return [results[index] for index in sorted(results)]
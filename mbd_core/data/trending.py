@@ -0,0 +1,247 @@
+"""Approximate trending keys over sliding time windows.
+
+A ``TrendingTracker`` counts keys, e.g. items, channels (``LIST_COLUMN``) or
+embedded urls (``EMBED_ITEMS_COLUMN``), in time buckets. Each bucket holds a
+Count-Min Sketch and a bounded set of its heaviest keys:
+
+- memory is bounded by ``n_buckets * (depth * width + capacity)`` whatever the
+  number of distinct keys
+- estimated counts over a window exceed the true counts by at most
+  ``epsilon * total count of the window``, with probability ``1 - delta``
+- the sketches of a window are summed, and trackers built by several worker
+  processes are merged by summing their sketches, since keys are hashed
+  deterministically
+
+Keys that are never among the heaviest of any bucket are not reported, hence each
+bucket keeps ``CANDIDATE_FACTOR`` times more candidates than the reported top-k.
+"""
+
+import math
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.schema import (
+    DEFAULT_EVENT_VALUE,
+    EDGE_TYPE_COLUMN,
+    EVENT_VALUE_COLUMN,
+    ITEM_COLUMN,
+    ITEM_CREATION_TIME_COLUMN,
+    TIME_COLUMN,
+)
+from mbd_core.utils import to_unix_seconds
+
+DEFAULT_EPSILON = 1e-4
+DEFAULT_DELTA = 0.01
+DEFAULT_BUCKET = pd.Timedelta(hours=1)
+DEFAULT_N_BUCKETS = 24
+CANDIDATE_FACTOR = 4
+COUNT_COLUMN = "count"
+
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+
+
+class CountMinSketch:
+    """Count-Min Sketch of weighted key counts."""
+
+    def __init__(self, width: int, depth: int) -> None:
+        """Create an empty sketch of depth rows of width counters."""
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64)
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        """Create a sketch overestimating counts by epsilon * total with prob 1 - delta."""
+        return cls(
+            width=math.ceil(math.e / epsilon), depth=math.ceil(math.log(1 / delta))
+        )
+
+    def _columns(self, keys: np.ndarray) -> np.ndarray:
+        """Counter of each key in each row, derived from one 64 bits hash per key."""
+        hashes = pd.util.hash_array(np.asarray(keys, dtype=object))
+        low = hashes & _LOW_32_BITS
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        columns = (low + rows * high) % np.uint64(self.width)
+        return cast(np.ndarray, columns.astype(np.int64))
+
+    def add(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        """Add counts to keys."""
+        columns = self._columns(keys)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(
+                columns[row], weights=counts, minlength=self.width
+            )
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        """Estimated counts of keys, never lower than the true counts."""
+        if not len(keys):
+            return np.zeros(0)
+        columns = self._columns(keys)
+        return np.asarray(
+            self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+        )
+
+    def merge(self, other: "CountMinSketch") -> None:
+        """Add the counts of a sketch of the same dimensions."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            msg = "Cannot merge sketches with different dimensions"
+            raise ValueError(msg)
+        self.table += other.table
+
+
+class TrendingTracker:
+    """Approximate top-k keys by count over sliding windows of time buckets.
+
+    Use one tracker per kind of key, e.g. one for items, one for channels and one
+    for urls.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        k: int = 100,
+        bucket: pd.Timedelta = DEFAULT_BUCKET,
+        n_buckets: int = DEFAULT_N_BUCKETS,
+        epsilon: float = DEFAULT_EPSILON,
+        delta: float = DEFAULT_DELTA,
+    ) -> None:
+        """Create an empty tracker.
+
+        k: default number of keys reported by top_k
+        bucket: duration of a time bucket
+        n_buckets: number of buckets kept, the longest window that can be queried
+        epsilon: overestimation of counts, relative to the total count of a window
+        delta: probability that an estimate exceeds the epsilon bound
+        """
+        self.k = k
+        self.bucket = pd.Timedelta(bucket)
+        self.n_buckets = n_buckets
+        self.epsilon = epsilon
+        self.delta = delta
+        self.capacity = k * CANDIDATE_FACTOR
+        self._sketches: dict[int, CountMinSketch] = {}
+        self._candidates: dict[int, pd.Index] = {}
+        self._latest: int | None = None
+
+    @property
+    def _config(self) -> tuple:
+        return (self.k, self.bucket, self.n_buckets, self.epsilon, self.delta)
+
+    @property
+    def _bucket_seconds(self) -> int:
+        return int(self.bucket.total_seconds())
+
+    def _new_sketch(self) -> CountMinSketch:
+        return CountMinSketch.from_error(self.epsilon, self.delta)
+
+    def _refresh_candidates(self, bucket: int, keys: pd.Index) -> None:
+        """Keep the heaviest of the current candidates and keys of a bucket."""
+        keys = self._candidates.get(bucket, pd.Index([])).union(keys)
+        estimates = pd.Series(self._sketches[bucket].estimate(keys.to_numpy()), keys)
+        self._candidates[bucket] = estimates.nlargest(self.capacity).index
+
+    def _expire(self) -> None:
+        assert self._latest is not None
+        for bucket in [b for b in self._sketches if b <= self._latest - self.n_buckets]:
+            del self._sketches[bucket]
+            del self._candidates[bucket]
+
+    def update(
+        self,
+        keys: pd.Series,
+        timestamps: pd.Series,
+        counts: pd.Series | None = None,
+    ) -> None:
+        """Count keys in the buckets of their timestamps.
+
+        counts: weight of each occurrence, 1 if None
+        """
+        batch_df = pd.DataFrame(
+            {
+                "_key": keys.to_numpy(),
+                "_bucket": to_unix_seconds(timestamps) // self._bucket_seconds,
+                COUNT_COLUMN: 1.0 if counts is None else counts.to_numpy(),
+            }
+        ).dropna(subset=["_key"])
+        if batch_df.empty:
+            return
+        self._latest = max(int(batch_df["_bucket"].max()), self._latest or 0)
+        batch_df = batch_df[batch_df["_bucket"] > self._latest - self.n_buckets]
+        batch_counts = batch_df.groupby(["_bucket", "_key"])[COUNT_COLUMN].sum()
+        for bucket, bucket_counts in batch_counts.groupby(level="_bucket"):
+            keys_index = bucket_counts.index.get_level_values("_key")
+            sketch = self._sketches.setdefault(int(bucket), self._new_sketch())
+            sketch.add(keys_index.to_numpy(), bucket_counts.to_numpy())
+            self._refresh_candidates(int(bucket), keys_index)
+        self._expire()
+
+    def update_interactions(
+        self, interaction_df: pd.DataFrame, event_types: list[str] | None = None
+    ) -> None:
+        """Count the items of interactions, weighted by their event value if any.
+
+        event_types: event types to count, all if None
+        """
+        if event_types is not None:
+            interaction_df = interaction_df[
+                interaction_df[EDGE_TYPE_COLUMN].isin(event_types)
+            ]
+        counts = (
+            interaction_df[EVENT_VALUE_COLUMN].fillna(DEFAULT_EVENT_VALUE)
+            if EVENT_VALUE_COLUMN in interaction_df
+            else None
+        )
+        self.update(interaction_df[ITEM_COLUMN], interaction_df[TIME_COLUMN], counts)
+
+    def update_items(self, item_df: pd.DataFrame, column: str) -> None:
+        """Count the values of a list column of items, e.g. channels or urls.
+
+        Values are counted at the creation time of their item.
+        """
+        exploded_df = item_df[[column, ITEM_CREATION_TIME_COLUMN]].explode(column)
+        self.update(exploded_df[column], exploded_df[ITEM_CREATION_TIME_COLUMN])
+
+    def top_k(
+        self, k: int | None = None, window: pd.Timedelta | None = None
+    ) -> pd.Series:
+        """Estimated counts of the top-k keys over the latest window.
+
+        k: number of keys, the k of the tracker if None
+        window: duration of the window ending with the latest bucket, all the
+            buckets kept if None
+        """
+        k = self.k if k is None else k
+        if self._latest is None:
+            return pd.Series([], dtype=np.float64, name=COUNT_COLUMN)
+        n_buckets = (
+            self.n_buckets
+            if window is None
+            else math.ceil(pd.Timedelta(window) / self.bucket)
+        )
+        buckets = [b for b in self._sketches if b > self._latest - n_buckets]
+        sketch = self._new_sketch()
+        candidates = pd.Index([])
+        for bucket in buckets:
+            sketch.merge(self._sketches[bucket])
+            candidates = candidates.union(self._candidates[bucket])
+        estimates = pd.Series(
+            sketch.estimate(candidates.to_numpy()), candidates, name=COUNT_COLUMN
+        )
+        return estimates.nlargest(k)
+
+    def merge(self, other: "TrendingTracker") -> None:
+        """Merge the counts of a tracker with the same configuration."""
+        if self._config != other._config:
+            msg = "Cannot merge trackers with different configurations"
+            raise ValueError(msg)
+        if other._latest is None:
+            return
+        self._latest = max(other._latest, self._latest or 0)
+        for bucket, other_sketch in other._sketches.items():
+            if bucket <= self._latest - self.n_buckets:
+                continue
+            self._sketches.setdefault(bucket, self._new_sketch()).merge(other_sketch)
+            self._refresh_candidates(bucket, other._candidates[bucket])
+        self._expire()
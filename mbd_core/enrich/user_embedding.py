@@ -0,0 +1,226 @@
+"""Batch aggregation of user semantic embeddings from interactions.
+
+The embedding of a user is the weighted mean of the embeddings of the items they
+interacted with. Interactions are weighted per ``EVENT_TYPES``, by their
+``EVENT_VALUE_COLUMN`` when present, and optionally decayed with time.
+
+A batch of interactions is a sparse users x items weight matrix, so the weighted
+sums of a batch are computed with one sparse-matrix x dense-matrix product
+against the item embeddings, instead of a python loop over users. The sums and
+total weights are kept per user, so new batches update the means incrementally:
+a batch only touches the rows of its users, and the per-user arrays grow
+geometrically as new users appear.
+"""
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.schema import (
+    DEFAULT_EVENT_VALUE,
+    EDGE_TYPE_COLUMN,
+    EVENT_TYPES,
+    EVENT_VALUE_COLUMN,
+    ITEM_COLUMN,
+    PROTOCOL_COLUMN,
+    TIME_COLUMN,
+    USER_COLUMN,
+    USER_UPDATE_TIME_COLUMN,
+)
+from mbd_core.enrich.schema import (
+    ITEM_SEM_EMBED_COLUMN,
+    LABEL_COLUMNS,
+    USER_SEM_EMBED_COLUMN,
+)
+from mbd_core.utils import MAX_DECAY_EXPONENT, to_unix_seconds
+
+DEFAULT_EVENT_WEIGHTS = {et.value: 1.0 for et in EVENT_TYPES}
+CHUNK_SIZE = 65536
+MIN_CAPACITY = 1024
+
+
+def sparse_dense_matmul(
+    rows: np.ndarray, cols: np.ndarray, data: np.ndarray, dense: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Multiply the sparse COO matrix (rows, cols, data) by a dense matrix.
+
+    Only the non-empty rows of the product are computed: returns the sorted
+    distinct rows and the product rows, with one row per distinct row. The entries
+    are reduced per row with np.add.reduceat, chunk by chunk, so at most
+    CHUNK_SIZE dense rows are materialized at a time.
+    """
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    result = np.zeros((len(unique_rows), dense.shape[1]), dtype=np.float64)
+    order = np.argsort(inverse, kind="stable")
+    rows, cols, data = inverse[order], cols[order], data[order]
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk_rows = rows[start : start + CHUNK_SIZE]
+        weighted = (
+            data[start : start + CHUNK_SIZE, None]
+            * dense[cols[start : start + CHUNK_SIZE]]
+        )
+        chunk_unique, starts = np.unique(chunk_rows, return_index=True)
+        # a row may continue from the previous chunk, hence += instead of =
+        result[chunk_unique] += np.add.reduceat(weighted, starts, axis=0)
+    return unique_rows, result
+
+
+class UserEmbeddingAggregator:
+    """Incremental weighted mean of the embeddings of the items users interacted with."""
+
+    def __init__(
+        self,
+        event_weights: dict[str, float] | None = None,
+        half_life: pd.Timedelta | None = None,
+    ) -> None:
+        """Create an empty aggregator.
+
+        event_weights: weight of each event type, event types without a weight are
+            ignored. Defaults to DEFAULT_EVENT_WEIGHTS
+        half_life: time for the weight of an interaction to halve, None to not decay
+        """
+        self.event_weights = (
+            DEFAULT_EVENT_WEIGHTS if event_weights is None else event_weights
+        )
+        self.half_life = None if half_life is None else pd.Timedelta(half_life)
+        # user -> row of the per-user arrays, grown in place as users appear
+        self._rows: dict[str, int] = {}
+        self._sums = np.zeros((0, 0), dtype=np.float64)
+        self._weights = np.zeros(0, dtype=np.float64)
+        self._last_seconds = np.zeros(0, dtype=np.int64)
+        self._protocols = np.zeros(0, dtype=object)
+        self._anchor: int | None = None
+
+    @property
+    def num_users(self) -> int:
+        """Number of users with at least one weighted interaction."""
+        return len(self._rows)
+
+    def _decay(self, seconds: np.ndarray) -> np.ndarray:
+        """Decay factors relative to the anchor, rebasing it when they grow large."""
+        if self.half_life is None:
+            return np.ones(len(seconds))
+        half_life = self.half_life.total_seconds()
+        if self._anchor is None:
+            self._anchor = int(seconds.min())
+        latest = int(seconds.max())
+        if (latest - self._anchor) / half_life > MAX_DECAY_EXPONENT:
+            factor = np.exp2((self._anchor - latest) / half_life)
+            self._sums *= factor
+            self._weights *= factor
+            self._anchor = latest
+        return np.asarray(np.exp2((seconds - self._anchor) / half_life))
+
+    def _intern(self, users: np.ndarray) -> np.ndarray:
+        unique_users, inverse = np.unique(users, return_inverse=True)
+        rows = self._rows
+        for user in unique_users:
+            rows.setdefault(user, len(rows))
+        self._reserve(self.num_users)
+        unique_rows = np.fromiter(
+            (rows[user] for user in unique_users),
+            dtype=np.int64,
+            count=len(unique_users),
+        )
+        return unique_rows[inverse]
+
+    def _user_index(self) -> pd.Index:
+        # dicts keep their insertion order, i.e. the order of the rows
+        return pd.Index(list(self._rows), dtype=object, name=USER_COLUMN)
+
+    def _reserve(self, n_users: int) -> None:
+        """Grow the per-user arrays geometrically to hold at least n_users."""
+        capacity = len(self._weights)
+        if n_users <= capacity:
+            return
+        new_capacity = max(n_users, 2 * capacity, MIN_CAPACITY)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((new_capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:capacity] = array
+            return grown
+
+        self._sums = grow(self._sums)
+        self._weights = grow(self._weights)
+        self._last_seconds = grow(self._last_seconds)
+        self._protocols = grow(self._protocols)
+
+    def update(self, interaction_df: pd.DataFrame, item_embed_df: pd.DataFrame) -> None:
+        """Add a batch of interactions, joined with the embeddings of their items.
+
+        interaction_df: interactions following INTERACTION_SCHEMA
+        item_embed_df: item embeddings, with ITEM_COLUMN and ITEM_SEM_EMBED_COLUMN.
+            Interactions with items without embedding are ignored
+        """
+        weights = (
+            interaction_df[EDGE_TYPE_COLUMN].map(self.event_weights).fillna(0.0)
+        ).to_numpy(dtype=np.float64)
+        if EVENT_VALUE_COLUMN in interaction_df:
+            weights *= (
+                interaction_df[EVENT_VALUE_COLUMN]
+                .fillna(DEFAULT_EVENT_VALUE)
+                .to_numpy()
+            )
+        item_embed_df = item_embed_df[
+            item_embed_df[ITEM_COLUMN].isin(interaction_df[ITEM_COLUMN])
+            & item_embed_df[ITEM_SEM_EMBED_COLUMN].notna()
+        ].drop_duplicates(subset=ITEM_COLUMN, keep="last")
+        item_rows = pd.Index(item_embed_df[ITEM_COLUMN]).get_indexer(
+            interaction_df[ITEM_COLUMN]
+        )
+        keep = (item_rows >= 0) & (weights > 0)
+        if not keep.any():
+            return
+
+        embeddings = np.stack(item_embed_df[ITEM_SEM_EMBED_COLUMN].to_numpy())
+        if not self.num_users:
+            self._sums = np.zeros((len(self._weights), embeddings.shape[1]))
+        elif embeddings.shape[1] != self._sums.shape[1]:
+            msg = (
+                f"Expected item embeddings of dimension {self._sums.shape[1]}, "
+                f"got {embeddings.shape[1]}"
+            )
+            raise ValueError(msg)
+
+        batch_df = interaction_df[keep]
+        seconds = to_unix_seconds(batch_df[TIME_COLUMN])
+        weights = weights[keep] * self._decay(seconds)
+        user_rows = self._intern(batch_df[USER_COLUMN].to_numpy())
+        unique_rows, sums = sparse_dense_matmul(
+            user_rows, item_rows[keep], weights, embeddings
+        )
+        self._sums[unique_rows] += sums
+        np.add.at(self._weights, user_rows, weights)
+        np.maximum.at(self._last_seconds, user_rows, seconds)
+        # with repeated indices the last assignment wins, i.e. the latest interaction
+        order = np.argsort(seconds, kind="stable")
+        protocols = batch_df[PROTOCOL_COLUMN].to_numpy()
+        self._protocols[user_rows[order]] = protocols[order]
+
+    def embeddings(self) -> pd.DataFrame:
+        """Weighted mean embedding of each user, one row per user."""
+        return pd.DataFrame(self._means(), index=self._user_index())
+
+    def _means(self) -> np.ndarray:
+        n = self.num_users
+        return self._sums[:n] / self._weights[:n, None]
+
+    def to_frame(self, namespace: str) -> pd.DataFrame:
+        """Get the user embeddings as a frame following USER_ENRICH_SCHEMA.
+
+        namespace: value of EDGE_TYPE_COLUMN, the namespace of the embeddings in
+            the vector database. Label columns are left empty
+        """
+        n = self.num_users
+        means = self._means().astype(np.float32)
+        return pd.DataFrame(
+            {
+                USER_COLUMN: self._user_index().astype(str),
+                PROTOCOL_COLUMN: self._protocols[:n].astype(str),
+                USER_UPDATE_TIME_COLUMN: pd.to_datetime(
+                    self._last_seconds[:n], unit="s", utc=True
+                ),
+                EDGE_TYPE_COLUMN: namespace,
+                USER_SEM_EMBED_COLUMN: list(means),
+                **{label: np.nan for label in LABEL_COLUMNS},
+            }
+        )
@@ -0,0 +1,367 @@
+"""In-process vector index over item and user semantic embeddings.
+
+A local stand-in for the remote vector database: vectors are grouped in
+namespaces, like ``EDGE_TYPE_COLUMN`` in ``USER_ENRICH_SCHEMA``, and searched
+in-process with batched NumPy matmuls.
+
+- exact search scores the queries against the corpus block by block and keeps a
+  running top-k, so memory is bounded by the query and block sizes
+- approximate search uses an IVF index: vectors are clustered with k-means and
+  only the ``nprobe`` clusters closest to a query are scored
+- indexes are saved as ``.npy`` files and memory-mapped when loaded
+"""
+
+import json
+import shutil
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.schema import EDGE_TYPE_COLUMN
+from mbd_core.utils import atomic_write_text
+
+METRICS = ("cosine", "dot")
+DEFAULT_NAMESPACE = ""
+QUERY_BATCH_SIZE = 256
+CORPUS_BLOCK_SIZE = 65536
+KMEANS_SAMPLES_PER_LIST = 256
+
+_META_FILE = "meta.json"
+_NAMESPACE_DIR_PREFIX = "namespace-"
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k best scores of each row, best first."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(
+        top, order, axis=1
+    )
+
+
+def _namespace_dir_name(namespace: str) -> str:
+    """Directory name of a namespace, stable across saves and safe for any name."""
+    return f"{_NAMESPACE_DIR_PREFIX}{namespace.encode().hex()}"
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    """Save an array through a temporary file.
+
+    The array may be memory-mapped from the file it replaces, which must not be
+    truncated while it is read.
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        np.save(f, array)
+    tmp_path.replace(path)
+
+
+@dataclass
+class _IVF:
+    centroids: np.ndarray
+    offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    rows: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    stale: bool = True
+
+
+@dataclass
+class _Namespace:
+    ids: np.ndarray
+    vectors: np.ndarray
+    ivf: _IVF | None = None
+    _row_index: pd.Index | None = field(default=None, repr=False)
+
+    def row_index(self) -> pd.Index:
+        """Index of the ids, cached until the ids change."""
+        if self._row_index is None:
+            self._row_index = pd.Index(self.ids)
+        return self._row_index
+
+    def set_ids(self, ids: np.ndarray) -> None:
+        self.ids = ids
+        self._row_index = None
+
+
+class VectorIndex:
+    """Namespaced vector index with exact and IVF top-k search."""
+
+    def __init__(self, dim: int, metric: str = "cosine") -> None:
+        """Create an empty index of dim-dimensional vectors.
+
+        metric: "cosine" normalizes the vectors on upsert and query, "dot" scores
+            the raw inner product
+        """
+        if metric not in METRICS:
+            msg = f"Unknown metric {metric}, expected one of {METRICS}"
+            raise ValueError(msg)
+        self.dim = dim
+        self.metric = metric
+        self._namespaces: dict[str, _Namespace] = {}
+
+    @property
+    def namespaces(self) -> list[str]:
+        """Names of the namespaces holding vectors."""
+        return list(self._namespaces)
+
+    def size(self, namespace: str = DEFAULT_NAMESPACE) -> int:
+        """Number of vectors in a namespace."""
+        return len(self._namespaces[namespace].ids) if namespace in self else 0
+
+    def __contains__(self, namespace: str) -> bool:
+        """Whether the namespace holds vectors."""
+        return namespace in self._namespaces
+
+    def _prepare(self, vectors: np.ndarray | Sequence) -> np.ndarray:
+        array = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if array.shape[1] != self.dim:
+            msg = f"Expected vectors of dimension {self.dim}, got {array.shape[1]}"
+            raise ValueError(msg)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(array, axis=1, keepdims=True)
+            array = array / np.where(norms == 0, 1, norms)
+        return array
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray | Sequence,
+        namespace: str = DEFAULT_NAMESPACE,
+    ) -> None:
+        """Insert vectors, replacing the vectors of ids already in the namespace."""
+        # the last vector of an id repeated in the batch wins
+        new_ids, last = np.unique(np.asarray(ids, dtype=str)[::-1], return_index=True)
+        new_vectors = self._prepare(vectors)[::-1][last]
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = _Namespace(ids=new_ids, vectors=new_vectors)
+            return
+
+        ns = self._namespaces[namespace]
+        rows = ns.row_index().get_indexer(new_ids)
+        existing = rows >= 0
+        if existing.any():
+            if not ns.vectors.flags.writeable:
+                # the stored vectors are a read-only memory map
+                ns.vectors = np.array(ns.vectors)
+            ns.vectors[rows[existing]] = new_vectors[existing]
+        if not existing.all():
+            ns.set_ids(np.concatenate([ns.ids, new_ids[~existing]]))
+            ns.vectors = np.concatenate([ns.vectors, new_vectors[~existing]])
+        if ns.ivf is not None:
+            ns.ivf.stale = True
+
+    def upsert_df(
+        self,
+        df: pd.DataFrame,
+        id_column: str,
+        embed_column: str,
+        namespace_column: str | None = EDGE_TYPE_COLUMN,
+    ) -> None:
+        """Upsert the embeddings of an enrich frame, e.g. following USER_ENRICH_SCHEMA.
+
+        Rows are upserted in the namespace given by namespace_column, or in the
+        default namespace when it is None. Rows without embedding are skipped.
+        """
+        embed_df = df[df[embed_column].notna()]
+        groups = (
+            embed_df.groupby(namespace_column, sort=False)
+            if namespace_column is not None
+            else [(DEFAULT_NAMESPACE, embed_df)]
+        )
+        for namespace, group_df in groups:
+            self.upsert(
+                group_df[id_column].tolist(),
+                np.stack(group_df[embed_column].to_numpy()),
+                namespace=str(namespace),
+            )
+
+    def delete(self, ids: Sequence[str], namespace: str = DEFAULT_NAMESPACE) -> None:
+        """Delete vectors by id, ignoring ids that are not in the namespace."""
+        if namespace not in self._namespaces:
+            return
+        ns = self._namespaces[namespace]
+        keep = ~np.isin(ns.ids, np.asarray(ids, dtype=str))
+        ns.set_ids(ns.ids[keep])
+        ns.vectors = ns.vectors[keep]
+        if not len(ns.ids):
+            del self._namespaces[namespace]
+        elif ns.ivf is not None:
+            ns.ivf.stale = True
+
+    def fetch(
+        self, ids: Sequence[str], namespace: str = DEFAULT_NAMESPACE
+    ) -> np.ndarray:
+        """Stored vectors of ids, NaN for ids that are not in the namespace."""
+        result = np.full((len(ids), self.dim), np.nan, dtype=np.float32)
+        if namespace in self._namespaces:
+            ns = self._namespaces[namespace]
+            rows = ns.row_index().get_indexer(np.asarray(ids, dtype=str))
+            result[rows >= 0] = ns.vectors[rows[rows >= 0]]
+        return result
+
+    def build_ivf(
+        self,
+        namespace: str = DEFAULT_NAMESPACE,
+        n_lists: int | None = None,
+        n_iter: int = 10,
+        seed: int = 0,
+    ) -> None:
+        """Cluster the vectors of a namespace with k-means for approximate search.
+
+        n_lists defaults to the square root of the number of vectors. Vectors
+        upserted later are assigned to the existing clusters on the next query.
+        """
+        ns = self._namespaces[namespace]
+        n_lists = min(n_lists or int(np.sqrt(len(ns.ids))) or 1, len(ns.ids))
+        rng = np.random.default_rng(seed)
+        n_samples = min(len(ns.ids), n_lists * KMEANS_SAMPLES_PER_LIST)
+        samples = ns.vectors[np.sort(rng.choice(len(ns.ids), n_samples, replace=False))]
+        centroids = samples[rng.choice(n_samples, n_lists, replace=False)]
+        for _ in range(n_iter):
+            assign = np.argmax(samples @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, samples)
+            counts = np.bincount(assign, minlength=n_lists)
+            # empty clusters keep their centroid
+            centroids = np.where(
+                counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids
+            )
+            if self.metric == "cosine":
+                centroids = self._prepare(centroids)
+        ns.ivf = _IVF(centroids=centroids.astype(np.float32))
+
+    def _assign_lists(self, ns: _Namespace) -> _IVF:
+        assert ns.ivf is not None
+        ivf = ns.ivf
+        if ivf.stale:
+            assign = np.concatenate(
+                [
+                    np.argmax(
+                        ns.vectors[i : i + CORPUS_BLOCK_SIZE] @ ivf.centroids.T, axis=1
+                    )
+                    for i in range(0, len(ns.ids), CORPUS_BLOCK_SIZE)
+                ]
+            )
+            ivf.rows = np.argsort(assign, kind="stable")
+            ivf.offsets = np.searchsorted(
+                assign[ivf.rows], np.arange(len(ivf.centroids) + 1)
+            )
+            ivf.stale = False
+        return ivf
+
+    def _exact(
+        self, ns: _Namespace, queries: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(ns.ids), CORPUS_BLOCK_SIZE):
+            block_scores = queries @ ns.vectors[start : start + CORPUS_BLOCK_SIZE].T
+            block_rows, block_scores = _top_k(block_scores, k)
+            rows = np.concatenate([best_rows, block_rows + start], axis=1)
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            idx, best_scores = _top_k(scores, k)
+            best_rows = np.take_along_axis(rows, idx, axis=1)
+        return best_rows, best_scores
+
+    def _approximate(
+        self, ns: _Namespace, queries: np.ndarray, k: int, nprobe: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ivf = self._assign_lists(ns)
+        probes, _ = _top_k(queries @ ivf.centroids.T, nprobe)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate(
+                [ivf.rows[ivf.offsets[lst] : ivf.offsets[lst + 1]] for lst in lists]
+            )
+            # clusters are empty when k-means leaves them empty or after deletes
+            if not len(candidates):
+                continue
+            idx, scores = _top_k(queries[i : i + 1] @ ns.vectors[candidates].T, k)
+            best_rows[i, : idx.shape[1]] = candidates[idx[0]]
+            best_scores[i, : idx.shape[1]] = scores[0]
+        return best_rows, best_scores
+
+    def query(
+        self,
+        vectors: np.ndarray | Sequence,
+        top_k: int = 10,
+        namespace: str = DEFAULT_NAMESPACE,
+        nprobe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the top_k most similar vectors of each query vector.
+
+        The search is exact unless nprobe is given and build_ivf was called for
+        the namespace, in which case only the nprobe closest clusters are scored.
+        Returns the ids and scores of the matches, best first, with shape
+        (n_queries, min(top_k, size)). Missing approximate matches have an empty
+        id and a score of -inf.
+        """
+        queries = self._prepare(vectors)
+        if namespace not in self._namespaces:
+            return (
+                np.empty((len(queries), 0), dtype=str),
+                np.empty((len(queries), 0), dtype=np.float32),
+            )
+        ns = self._namespaces[namespace]
+        k = min(top_k, len(ns.ids))
+        results = []
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = queries[start : start + QUERY_BATCH_SIZE]
+            if nprobe is not None and ns.ivf is not None:
+                results.append(self._approximate(ns, batch, k, nprobe))
+            else:
+                results.append(self._exact(ns, batch, k))
+        rows = np.concatenate([rows for rows, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+        ids = np.where(rows >= 0, ns.ids[np.maximum(rows, 0)], "")
+        return ids, scores
+
+    def save(self, path: str | Path) -> None:
+        """Save the index to a directory, one subdirectory per namespace.
+
+        Files are replaced atomically, so an index loaded from the same directory
+        can be saved back to it. The directories of namespaces that no longer
+        exist are removed.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        namespaces = {}
+        for namespace, ns in self._namespaces.items():
+            ns_dir = path / _namespace_dir_name(namespace)
+            ns_dir.mkdir(exist_ok=True)
+            _save_array(ns_dir / "ids.npy", ns.ids)
+            _save_array(ns_dir / "vectors.npy", ns.vectors)
+            if ns.ivf is not None:
+                _save_array(ns_dir / "centroids.npy", ns.ivf.centroids)
+            else:
+                (ns_dir / "centroids.npy").unlink(missing_ok=True)
+            namespaces[namespace] = ns_dir.name
+        meta = {"dim": self.dim, "metric": self.metric, "namespaces": namespaces}
+        atomic_write_text(path / _META_FILE, json.dumps(meta))
+        for ns_dir in path.glob(f"{_NAMESPACE_DIR_PREFIX}*"):
+            if ns_dir.name not in namespaces.values():
+                shutil.rmtree(ns_dir)
+
+    @classmethod
+    def load(cls, path: str | Path, *, mmap: bool = True) -> "VectorIndex":
+        """Load an index saved with save, memory-mapping the vectors by default."""
+        path = Path(path)
+        meta = json.loads((path / _META_FILE).read_text())
+        index = cls(dim=meta["dim"], metric=meta["metric"])
+        mmap_mode: Literal["r"] | None = "r" if mmap else None
+        for namespace, ns_dir_name in meta["namespaces"].items():
+            ns_dir = path / ns_dir_name
+            ns = _Namespace(
+                ids=np.load(ns_dir / "ids.npy"),
+                vectors=np.load(ns_dir / "vectors.npy", mmap_mode=mmap_mode),
+            )
+            if (ns_dir / "centroids.npy").exists():
+                ns.ivf = _IVF(centroids=np.load(ns_dir / "centroids.npy"))
+            index._namespaces[namespace] = ns
+        return index
@@ -0,0 +1,27 @@
+"""Generic helpers shared by the mbd core modules."""
+
+import os
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+# rebase the anchor of decayed values before 2 ** exponent gets close to the
+# float64 range
+MAX_DECAY_EXPONENT = 512.0
+
+
+def to_unix_seconds(timestamps: pd.Series) -> np.ndarray:
+    """Convert a timestamp column to integer unix seconds."""
+    return cast(np.ndarray, pd.DatetimeIndex(timestamps).asi8 // 10**9)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write a text file through a temporary file, so it is never seen partially."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
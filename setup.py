@@ -46,5 +46,14 @@ setup(
     },
 
     install_requires=get_requirements(REQUIREMENTS_FILE),
+    extras_require={
+        "modin": ["modin"],
+        "polars": ["polars>=1.0.0"],
+    },
+    entry_points={
+        "console_scripts": [
+            "mbd-backfill=mbd_core.data.farcaster.backfill:main",
+        ],
+    },
     zip_safe=False,
 )
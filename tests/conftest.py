@@ -9,6 +9,8 @@ def pytest_configure():
     os.environ["EMBEDS_METADATA_URL"] = (
         "https://api.modprotocol.org/api/cast-embeds-metadata/by-url"
     )
+    # run modin on the local python engine unless another engine is configured
+    os.environ.setdefault("MODIN_ENGINE", "python")
 
 
 @pytest.fixture(scope="session")
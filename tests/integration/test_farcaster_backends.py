@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from mbd_core.data.farcaster import backends, utils
+from mbd_core.data.farcaster.backends import BACKEND_ENV_VAR, get_backend
+from mbd_core.data.schema import INTERACTION_SCHEMA, ITEM_META_SCHEMA, USER_META_SCHEMA
+
+BACKEND_NAMES = [
+    "pandas",
+    pytest.param("modin", marks=pytest.mark.filterwarnings("ignore")),
+    "polars",
+]
+
+
+@pytest.fixture()
+def backend(request):
+    if request.param != "pandas":
+        pytest.importorskip(request.param)
+    return get_backend(request.param)
+
+
+@pytest.fixture()
+def _fake_urls_metadata(monkeypatch):
+    async def fake_get_urls_list_metadata(mylist):
+        return [
+            {
+                url: {"title": url, "customOpenGraph": {"fc:frame": "vNext"}}
+                for url in urls
+                if "frame" in url or len(url) % 2
+            }
+            for urls in mylist
+        ]
+
+    monkeypatch.setattr(utils, "get_urls_list_metadata", fake_get_urls_list_metadata)
+
+
+def _run(backend, func, *dfs):
+    return backend.to_pandas(func(*[backend.from_pandas(df) for df in dfs]))
+
+
+def _assert_same(result_df, expected_df, keys):
+    pd.testing.assert_frame_equal(
+        result_df.sort_values(keys).reset_index(drop=True),
+        expected_df.sort_values(keys).reset_index(drop=True),
+    )
+
+
+@pytest.mark.parametrize("backend", BACKEND_NAMES, indirect=True)
+def test_backend_interaction_df(
+    backend, farcaster_casts_dataframe, farcaster_reactions_dataframe
+):
+    dfs = (farcaster_casts_dataframe, farcaster_reactions_dataframe)
+    interaction_df = _run(backend, backend.get_interaction_df, *dfs)
+    INTERACTION_SCHEMA.validate(interaction_df)
+    _assert_same(
+        interaction_df,
+        get_backend().get_interaction_df(*dfs),
+        ["item_id", "user_id", "event_type", "timestamp"],
+    )
+
+
+@pytest.mark.parametrize("backend", BACKEND_NAMES, indirect=True)
+def test_backend_user_df(backend, farcaster_users_dataframe):
+    user_df = _run(backend, backend.get_user_df, farcaster_users_dataframe)
+    USER_META_SCHEMA.validate(user_df)
+    _assert_same(
+        user_df, get_backend().get_user_df(farcaster_users_dataframe), ["user_id"]
+    )
+
+
+@pytest.mark.usefixtures("_fake_urls_metadata")
+@pytest.mark.parametrize("backend", BACKEND_NAMES, indirect=True)
+def test_backend_item_df(backend, farcaster_casts_dataframe):
+    casts_df = farcaster_casts_dataframe.head(500)
+    item_df = _run(backend, backend.get_item_df, casts_df)
+    ITEM_META_SCHEMA.validate(item_df)
+    _assert_same(item_df, get_backend().get_item_df(casts_df), ["item_id"])
+
+
+def test_get_backend_from_env(monkeypatch):
+    monkeypatch.setenv(BACKEND_ENV_VAR, "pandas")
+    assert get_backend().name == "pandas"
+    monkeypatch.setenv(BACKEND_ENV_VAR, "spark")
+    with pytest.raises(ValueError, match="spark"):
+        get_backend()
+
+
+def test_get_backend_without_optional_dependency(monkeypatch):
+    def missing_module(name):
+        msg = f"No module named {name}"
+        raise ImportError(msg)
+
+    monkeypatch.setattr(backends.importlib, "import_module", missing_module)
+    with pytest.raises(ImportError, match=r"mbd_core\[polars\]"):
+        get_backend("polars")
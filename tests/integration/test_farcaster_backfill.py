@@ -0,0 +1,203 @@
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from mbd_core.data.farcaster import backfill
+from mbd_core.data.farcaster.backfill import (
+    BackfillError,
+    BackfillInputs,
+    get_time_range,
+    get_work_units,
+    main,
+    read_time_range,
+    run_backfill,
+)
+from mbd_core.data.schema import INTERACTION_SCHEMA, USER_META_SCHEMA
+
+DATA_DIR = Path("tests/data/farcaster")
+INPUTS = BackfillInputs(
+    casts=DATA_DIR / "casts.parquet",
+    reactions=DATA_DIR / "reactions.parquet",
+    users=DATA_DIR / "users.parquet",
+)
+START = pd.Timestamp("2024-07-01", tz="UTC")
+
+
+def test_work_units_and_time_range():
+    units = get_work_units(
+        START + pd.Timedelta(minutes=30),
+        START + pd.Timedelta(hours=6),
+        unit=pd.Timedelta(hours=6),
+        datasets=["interactions"],
+    )
+    assert [(u.start, u.end) for u in units] == [
+        (START, START + pd.Timedelta(hours=6)),
+        (START + pd.Timedelta(hours=6), START + pd.Timedelta(hours=12)),
+    ]
+    assert units[0].name == "20240701T000000-20240701T060000"
+    assert get_time_range([INPUTS.casts, INPUTS.reactions]) == (
+        pd.Timestamp("2024-07-01 08:00:01", tz="UTC"),
+        pd.Timestamp("2024-07-01 13:59:59", tz="UTC"),
+    )
+    casts_df = read_time_range(
+        INPUTS.casts,
+        START + pd.Timedelta(hours=13, minutes=30),
+        START + pd.Timedelta(hours=14),
+    )
+    assert not casts_df.empty
+    assert (casts_df["timestamp"] >= START + pd.Timedelta(hours=13, minutes=30)).all()
+
+
+def test_run_backfill(farcaster_reactions_dataframe, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    results = run_backfill(
+        INPUTS,
+        tmp_path,
+        unit=pd.Timedelta(hours=1),
+        datasets=["interactions", "users_meta_data"],
+        workers=1,
+    )
+    # the range of all the inputs, from 08:00 to 18:59, for both datasets
+    assert len(results) == 2 * 11
+    assert "[22/22]" in caplog.text
+    assert sum(result.rows > 0 for result in results) == 3  # noqa: PLR2004
+
+    interaction_df = pd.concat(
+        [
+            pd.read_parquet(path)
+            for path in sorted((tmp_path / "interactions").glob("*/message/*.parquet"))
+        ]
+    )
+    INTERACTION_SCHEMA.validate(interaction_df)
+    reactions = interaction_df[interaction_df["event_type"].isin(["like", "share"])]
+    assert len(reactions) == len(
+        farcaster_reactions_dataframe.dropna(subset=["target_hash"])
+    )
+    user_files = list((tmp_path / "users_meta_data").glob("date=2024-07-01/message/*"))
+    assert len(user_files) == 1
+    USER_META_SCHEMA.validate(pd.read_parquet(user_files[0]))
+
+    checkpoint = json.loads(
+        (
+            tmp_path / "_backfill/users_meta_data/20240701T180000-20240701T190000.json"
+        ).read_text()
+    )
+    assert checkpoint["output"] == str(user_files[0])
+    # empty units are checkpointed without output
+    empty = tmp_path / "_backfill/interactions/20240701T090000-20240701T100000.json"
+    assert json.loads(empty.read_text())["output"] is None
+
+    # everything is done, nothing is run again
+    assert (
+        run_backfill(
+            INPUTS,
+            tmp_path,
+            unit=pd.Timedelta(hours=1),
+            datasets=["interactions", "users_meta_data"],
+            workers=1,
+        )
+        == []
+    )
+
+
+def test_resume_after_failure(tmp_path, monkeypatch):
+    get_user_df = backfill.get_user_df
+
+    def failing_get_user_df(_):
+        msg = "OOM"
+        raise MemoryError(msg)
+
+    monkeypatch.setattr(backfill, "get_user_df", failing_get_user_df)
+    with pytest.raises(BackfillError, match="1 units failed"):
+        run_backfill(
+            INPUTS,
+            tmp_path,
+            unit=pd.Timedelta(hours=1),
+            datasets=["interactions", "users_meta_data"],
+            workers=1,
+        )
+    assert len(list((tmp_path / "_backfill/interactions").glob("*.json"))) == 11  # noqa: PLR2004
+
+    monkeypatch.setattr(backfill, "get_user_df", get_user_df)
+    results = run_backfill(
+        INPUTS,
+        tmp_path,
+        unit=pd.Timedelta(hours=1),
+        datasets=["interactions", "users_meta_data"],
+        workers=1,
+    )
+    assert [(r.dataset, r.name) for r in results] == [
+        ("users_meta_data", "20240701T180000-20240701T190000")
+    ]
+
+
+def test_main_runs_units_in_processes(tmp_path):
+    main(
+        [
+            "--reactions",
+            str(INPUTS.reactions),
+            "--casts",
+            str(INPUTS.casts),
+            "--out",
+            str(tmp_path),
+            "--start",
+            "2024-07-01 08:00",
+            "--end",
+            "2024-07-01 09:30",
+            "--unit",
+            "30min",
+            "--datasets",
+            "interactions",
+            "--workers",
+            "2",
+        ]
+    )
+    checkpoints = sorted((tmp_path / "_backfill/interactions").glob("*.json"))
+    assert [c.stem for c in checkpoints] == [
+        "20240701T080000-20240701T083000",
+        "20240701T083000-20240701T090000",
+        "20240701T090000-20240701T093000",
+        "20240701T093000-20240701T100000",
+    ]
+
+    with pytest.raises(BackfillError):
+        run_backfill(
+            BackfillInputs(casts=INPUTS.casts),
+            tmp_path,
+            unit=pd.Timedelta(hours=6),
+            datasets=["users_meta_data"],
+            workers=2,
+        )
+
+
+def test_naive_timestamps_and_errors(tmp_path, monkeypatch):
+    naive_path = tmp_path / "naive.parquet"
+    pd.DataFrame(
+        {"timestamp": pd.to_datetime(["2024-07-01 01:00", "2024-07-01 02:00"])}
+    ).to_parquet(naive_path)
+    assert get_time_range([naive_path]) == (
+        START + pd.Timedelta(hours=1),
+        START + pd.Timedelta(hours=2),
+    )
+    assert len(read_time_range(naive_path, START, START + pd.Timedelta(hours=2))) == 1
+
+    empty_path = tmp_path / "empty.parquet"
+    pd.DataFrame({"timestamp": pd.to_datetime([])}).to_parquet(empty_path)
+    with pytest.raises(ValueError, match="No messages"):
+        get_time_range([empty_path])
+
+    monkeypatch.setattr(backfill, "get_item_df", lambda casts_df: casts_df[["hash"]])
+    unit = get_work_units(START, START, unit=pd.Timedelta(days=1))[0]
+    assert unit.dataset == "items_meta_data"
+    result = backfill.run_unit(unit, INPUTS, tmp_path)
+    assert result.rows == len(pd.read_parquet(INPUTS.casts))
+
+    with pytest.raises(ValueError, match="Missing input messages"):
+        backfill.run_unit(unit, BackfillInputs(), tmp_path)
+    with pytest.raises(ValueError, match="Unknown dataset"):
+        backfill.run_unit(
+            backfill.WorkUnit("posts", unit.start, unit.end), INPUTS, tmp_path
+        )
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from mbd_core.data.farcaster.ingest import (
+    ingest_casts,
+    parquet_chunk_writer,
+    read_parquet_chunks,
+)
+
+CASTS_PATH = "tests/data/farcaster/casts.parquet"
+
+
+def test_read_parquet_chunks(farcaster_casts_dataframe):
+    chunks = list(read_parquet_chunks(CASTS_PATH, chunk_rows=10))
+    assert all(len(chunk) <= 10 for chunk in chunks)  # noqa: PLR2004
+    assert sum(map(len, chunks)) == len(farcaster_casts_dataframe)
+
+
+def test_ingest_casts(farcaster_casts_dataframe, tmp_path):
+    paths = ingest_casts(CASTS_PATH, tmp_path / "items", chunk_rows=10)
+    n_chunks = len(list(read_parquet_chunks(CASTS_PATH, chunk_rows=10)))
+    assert [path.name for path in paths] == [
+        f"part-{i:05d}.parquet" for i in range(n_chunks)
+    ]
+    item_df = pd.concat([pd.read_parquet(path) for path in paths])
+    # the items are validated before they are written
+    assert set(item_df["item_id"]) == set("0x" + farcaster_casts_dataframe["hash"])
+
+
+def test_parquet_chunk_writer_names_parts_by_index(tmp_path):
+    write = parquet_chunk_writer(tmp_path)
+    chunk_df = pd.DataFrame({"a": [1]})
+    # chunks may reach the writer out of order
+    assert write((1, chunk_df)).name == "part-00001.parquet"
+    assert write((0, chunk_df.assign(a=0))).name == "part-00000.parquet"
+    assert pd.read_parquet(tmp_path / "part-00000.parquet")["a"].tolist() == [0]
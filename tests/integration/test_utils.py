@@ -1,6 +1,69 @@
-from mbd_core.data.farcaster.utils import clean_text
+import pandas as pd
+
+from mbd_core.data.farcaster import utils
+from mbd_core.data.farcaster.utils import canonicalize_url, clean_text, extract_urls
 
 
 def test_clean_text(farcaster_casts_dataframe):
     clean_df = clean_text(farcaster_casts_dataframe, "text", "timestamp")
     assert clean_df.shape[0] <= farcaster_casts_dataframe.shape[0]
+
+
+def test_extract_urls():
+    text = pd.Series(
+        [
+            "see https://a.com/x. and (https://b.com/y?q=1), ok",
+            None,
+            "https://c.com/z!!\nhttps://d.com",
+            "https://e.com/A_(b) and (https://e.com/A_(c))",
+        ],
+        index=[3, 1, 2, 4],
+    )
+    assert extract_urls(text).to_dict() == {
+        3: ["https://a.com/x", "https://b.com/y?q=1"],
+        1: [],
+        2: ["https://c.com/z", "https://d.com"],
+        4: ["https://e.com/A_(b)", "https://e.com/A_(c)"],
+    }
+
+
+def test_canonicalize_url():
+    assert (
+        canonicalize_url("HTTPS://Example.COM:443/Path?utm_source=x&id=1&fbclid=y#top")
+        == "https://example.com/Path?id=1"
+    )
+    assert canonicalize_url("http://example.com:8080") == "http://example.com:8080/"
+    assert canonicalize_url("https://a.com/?url=https://b.com") == (
+        "https://a.com/?url=https://b.com"
+    )
+    assert canonicalize_url("https://a.com:port/") == "https://a.com:port/"
+
+
+def test_enrich_df_with_url_metadata_fetches_canonical_urls(monkeypatch):
+    requested = []
+
+    async def fake_get_urls_list_metadata(mylist):
+        requested.extend(url for urls in mylist for url in urls)
+        return [{url: {"title": url} for url in urls} for urls in mylist]
+
+    monkeypatch.setattr(utils, "get_urls_list_metadata", fake_get_urls_list_metadata)
+    url_df = pd.DataFrame(
+        {
+            "item_id": ["1", "2", "3"],
+            "urls": [
+                ["https://A.com/x?utm_source=fc"],
+                ["https://a.com/x", "https://b.com"],
+                [],
+            ],
+        }
+    )
+    enriched_df = utils.enrich_df_with_url_metadata(
+        url_df, "urls", "item_id", "url_text", "frame"
+    )
+    assert sorted(requested) == ["https://a.com/x", "https://b.com/"]
+    assert enriched_df["url_text"].tolist() == [
+        "https://a.com/x",
+        "https://a.com/x https://b.com/",
+        "",
+    ]
+    assert enriched_df["urls"].tolist() == url_df["urls"].tolist()
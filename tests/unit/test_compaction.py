@@ -0,0 +1,178 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from mbd_core.data.compaction import (
+    INTERACTION_COMPACTION_SPEC,
+    USER_COMPACTION_SPEC,
+    CompactionSpec,
+    compact_dataset,
+    compact_partition,
+    find_uncompacted_partitions,
+    is_partition_compacted,
+    remove_message_files,
+)
+from mbd_core.data.schema import (
+    INTERACTION_DIR,
+    MERGED_MESSAGE_FILE,
+    MESSAGE_FOLDER,
+    USER_META_DIR,
+)
+
+
+def _write_messages(partition_dir, frames):
+    message_dir = partition_dir / MESSAGE_FOLDER
+    message_dir.mkdir(parents=True)
+    for i, df in enumerate(frames):
+        df.to_parquet(message_dir / f"{i:03d}.parquet", index=False)
+
+
+def _user_frame(user_ids, minutes):
+    return pd.DataFrame(
+        {
+            "user_id": [str(u) for u in user_ids],
+            "protocol": "farcaster",
+            "user_update_timestamp": pd.to_datetime(
+                [
+                    pd.Timestamp("2024-07-01", tz="UTC") + pd.Timedelta(minutes=m)
+                    for m in minutes
+                ]
+            ),
+            "profile": [f"{u}@{m}" for u, m in zip(user_ids, minutes, strict=True)],
+        }
+    )
+
+
+def _read_merged(paths):
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+
+def test_compact_partition_dedups_users_by_latest_update(tmp_path):
+    partition_dir = tmp_path / USER_META_DIR / "date=2024-07-01"
+    _write_messages(
+        partition_dir,
+        [
+            _user_frame([1, 2, 3], [10, 5, 1]),
+            _user_frame([1, 4], [2, 3]),
+            _user_frame([2, 3], [20, 1]),
+        ],
+    )
+    paths = compact_partition(
+        partition_dir, USER_COMPACTION_SPEC, run_rows=2, batch_size=2, row_group_size=2
+    )
+
+    merged_df = _read_merged(paths)
+    assert merged_df["user_id"].tolist() == ["3", "4", "1", "2"]
+    assert merged_df["profile"].tolist() == ["3@1", "4@3", "1@10", "2@20"]
+    assert merged_df["user_update_timestamp"].is_monotonic_increasing
+    assert is_partition_compacted(partition_dir)
+    marker = (partition_dir / MERGED_MESSAGE_FILE).read_text().split()
+    assert marker == [path.name for path in paths]
+
+
+def test_compact_partition_splits_files_and_row_groups(tmp_path):
+    partition_dir = tmp_path / "date=2024-07-01"
+    frames = [
+        pd.DataFrame(
+            {
+                "user_id": [str(i)] * 5,
+                "item_id": [f"0x{i}{j}" for j in range(5)],
+                "timestamp": pd.date_range("2024-07-01", periods=5, freq="h", tz="UTC")
+                + pd.Timedelta(minutes=i),
+                "event_type": "like",
+                "protocol": "farcaster",
+            }
+        )
+        for i in range(7)
+    ]
+    _write_messages(partition_dir, frames)
+    paths = compact_partition(
+        partition_dir,
+        INTERACTION_COMPACTION_SPEC,
+        run_rows=4,
+        batch_size=3,
+        row_group_size=4,
+        max_rows_per_file=10,
+    )
+
+    assert [pq.ParquetFile(path).metadata.num_rows for path in paths] == [10] * 3 + [5]
+    assert pq.ParquetFile(paths[0]).metadata.num_row_groups == 3  # noqa: PLR2004
+    merged_df = _read_merged(paths)
+    expected_df = pd.concat(frames).sort_values("timestamp", kind="stable")
+    assert merged_df["timestamp"].tolist() == expected_df["timestamp"].tolist()
+    assert sorted(merged_df["item_id"]) == sorted(expected_df["item_id"])
+
+
+def test_compact_partition_unifies_null_columns(tmp_path):
+    partition_dir = tmp_path / "date=2024-07-01"
+    frames = [
+        pd.DataFrame({"item_id": ["0xa"], "position": [2], "app": [None]}),
+        pd.DataFrame({"item_id": ["0xb"], "position": [1], "app": ["warpcast"]}),
+    ]
+    _write_messages(partition_dir, frames)
+    # the stream ends exactly at a file boundary
+    paths = compact_partition(
+        partition_dir, CompactionSpec(sort_column="position"), max_rows_per_file=1
+    )
+    assert len(paths) == 2  # noqa: PLR2004
+    merged_df = _read_merged(paths)
+    assert merged_df["item_id"].tolist() == ["0xb", "0xa"]
+    assert merged_df["app"].tolist() == ["warpcast", None]
+
+
+def test_compact_partition_fills_missing_columns(tmp_path):
+    partition_dir = tmp_path / "date=2024-07-01"
+    _write_messages(
+        partition_dir,
+        [
+            _user_frame([1, 2], [1, 1]).drop(columns="user_update_timestamp"),
+            _user_frame([2, 3], [2, 2]).assign(username=["b", "c"]),
+            _user_frame([1], [3]).drop(columns="profile").assign(app=["warpcast"]),
+        ],
+    )
+    merged_df = _read_merged(compact_partition(partition_dir, USER_COMPACTION_SPEC))
+    # rows without version are superseded by any versioned row of their key
+    assert merged_df["user_id"].tolist() == ["2", "3", "1"]
+    assert merged_df["username"].tolist() == ["b", "c", None]
+    assert merged_df["profile"].tolist() == ["2@2", "3@2", None]
+    assert merged_df["app"].tolist() == [None, None, "warpcast"]
+
+
+def test_compact_partition_is_idempotent(tmp_path):
+    partition_dir = tmp_path / "date=2024-07-01"
+    # every row of the first file is superseded by the second one
+    _write_messages(partition_dir, [_user_frame([1], [1]), _user_frame([1], [2])])
+    paths = compact_partition(partition_dir, USER_COMPACTION_SPEC)
+    assert _read_merged(paths)["profile"].tolist() == ["1@2"]
+    # the merged files of the previous attempt are replaced
+    assert (
+        compact_partition(partition_dir, USER_COMPACTION_SPEC, overwrite=True) == paths
+    )
+    (partition_dir / MESSAGE_FOLDER / "002.parquet").write_bytes(b"")
+    assert compact_partition(partition_dir, USER_COMPACTION_SPEC) == paths
+
+    remove_message_files(partition_dir)
+    assert not (partition_dir / MESSAGE_FOLDER).exists()
+    with pytest.raises(FileNotFoundError):
+        compact_partition(partition_dir, USER_COMPACTION_SPEC, overwrite=True)
+
+
+def test_compact_dataset(tmp_path):
+    user_dir = tmp_path / USER_META_DIR / "date=2024-07-01"
+    interaction_dir = tmp_path / INTERACTION_DIR / "date=2024-07-01"
+    _write_messages(user_dir, [_user_frame([1, 2], [1, 2])])
+    _write_messages(
+        interaction_dir,
+        [
+            pd.DataFrame(
+                {"timestamp": pd.to_datetime(["2024-07-01"]).tz_localize("UTC")}
+            )
+        ],
+    )
+    assert find_uncompacted_partitions(tmp_path) == sorted([user_dir, interaction_dir])
+
+    compacted = compact_dataset(tmp_path)
+    assert set(compacted) == {user_dir, interaction_dir}
+    assert find_uncompacted_partitions(tmp_path) == []
+    with pytest.raises(ValueError, match="has not been compacted"):
+        remove_message_files(tmp_path)
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mbd_core.data.engagement import EngagementAggregator
+
+
+def _interaction_df(rows):
+    return pd.DataFrame(
+        [
+            {
+                "user_id": user_id,
+                "item_id": item_id,
+                "event_type": event_type,
+                "timestamp": pd.Timestamp("2024-07-01", tz="UTC")
+                + pd.Timedelta(hours=hours),
+                "protocol": "farcaster",
+            }
+            for user_id, item_id, event_type, hours in rows
+        ]
+    )
+
+
+BATCHES = [
+    _interaction_df(
+        [("1", "0xa", "like", 0), ("2", "0xa", "like", 0.5), ("1", "0xb", "post", 1)]
+    ),
+    _interaction_df([("3", "0xa", "share", 1.5), ("2", "0xa", "like", 25)]),
+]
+
+
+def test_windowed_counts_match_groupby():
+    aggregator = EngagementAggregator(key_column="item_id")
+    for batch in BATCHES:
+        aggregator.update(batch)
+
+    all_df = pd.concat(BATCHES)
+    expected = all_df.groupby(
+        ["item_id", all_df["timestamp"].dt.floor("h"), "event_type"]
+    ).size()
+    counts = aggregator.counts().to_numpy().ravel()
+    assert sorted(counts[counts > 0].tolist()) == sorted(expected.tolist())
+    assert aggregator.counts().loc[("0xa", 477720), "like"] == 2  # noqa: PLR2004
+
+    totals = aggregator.totals(end=pd.Timestamp("2024-07-02", tz="UTC"))
+    assert totals.loc["0xa", ["like", "share"]].tolist() == [2, 1]
+    assert (
+        aggregator.totals(start=pd.Timestamp("2024-07-02", tz="UTC")).loc["0xa", "like"]
+        == 1
+    )
+
+    daily = EngagementAggregator(key_column="user_id", window="day")
+    for batch in BATCHES:
+        daily.update(batch)
+    assert daily.counts().index.get_level_values("unix_hour").unique().tolist() == [
+        477720,
+        477744,
+    ]
+
+    aggregator.drop_windows_before(pd.Timestamp("2024-07-02", tz="UTC"))
+    assert aggregator.counts()["like"].sum() == 1
+
+
+def test_decayed_scores():
+    aggregator = EngagementAggregator(half_life=pd.Timedelta(hours=1))
+    for batch in BATCHES:
+        aggregator.update(batch)
+    at = pd.Timestamp("2024-07-02 02:00", tz="UTC")
+    scores = aggregator.scores(at=at)
+    assert scores.loc["0xa", "like"] == pytest.approx(2**-26 + 2**-25.5 + 2**-1)
+    assert scores.loc["0xb", "post"] == pytest.approx(2**-25)
+    assert aggregator.scores().loc["0xa", "like"] == pytest.approx(1.0, rel=1e-6)
+    with pytest.raises(ValueError, match="before the latest interaction"):
+        aggregator.scores(at=pd.Timestamp("2024-07-01 02:00", tz="UTC"))
+
+
+def test_merge_and_persistence(tmp_path):
+    single = EngagementAggregator(half_life=pd.Timedelta(hours=6))
+    workers = [EngagementAggregator(half_life=pd.Timedelta(hours=6)) for _ in BATCHES]
+    for worker, batch in zip(workers, BATCHES, strict=True):
+        single.update(batch)
+        worker.update(batch)
+
+    merged = EngagementAggregator(half_life=pd.Timedelta(hours=6))
+    for worker in reversed(workers):
+        merged.merge(worker)
+    merged.merge(EngagementAggregator(half_life=pd.Timedelta(hours=6)))
+    pd.testing.assert_frame_equal(
+        merged.counts().sort_index(), single.counts().sort_index()
+    )
+    pd.testing.assert_frame_equal(
+        merged.scores().sort_index(), single.scores().sort_index()
+    )
+
+    merged.save(tmp_path / "state")
+    loaded = EngagementAggregator.load(tmp_path / "state")
+    pd.testing.assert_frame_equal(loaded.counts(), merged.counts())
+    pd.testing.assert_frame_equal(loaded.scores(), merged.scores())
+
+    with pytest.raises(ValueError, match="different configurations"):
+        merged.merge(EngagementAggregator())
+    with pytest.raises(ValueError, match="Unknown window"):
+        EngagementAggregator(window="week")
+
+
+def test_rebase_keeps_scores():
+    aggregator = EngagementAggregator(half_life=pd.Timedelta(seconds=1))
+    aggregator.update(_interaction_df([("1", "0xa", "like", 0)]))
+    aggregator.update(_interaction_df([("1", "0xa", "like", 1)]))
+    assert np.isfinite(aggregator.scores().to_numpy()).all()
+    assert aggregator.scores().loc["0xa", "like"] == pytest.approx(1.0)
+    at = pd.Timestamp("2024-07-01 01:00:01", tz="UTC")
+    assert aggregator.scores(at=at).loc["0xa", "like"] == pytest.approx(0.5)
+
+
+def test_empty_batches_and_lazy_compaction(monkeypatch):
+    monkeypatch.setattr("mbd_core.data.engagement.MAX_PENDING_BATCHES", 1)
+    aggregator = EngagementAggregator(half_life=pd.Timedelta(hours=1))
+    assert aggregator.scores().empty
+    aggregator.update(BATCHES[0].iloc[:0])
+    for batch in BATCHES:
+        aggregator.update(batch)
+    assert len(aggregator._pending_counts) <= 1
+    assert aggregator.totals().to_numpy().sum() == sum(map(len, BATCHES))
+
+    # the state is rebased before merging an aggregator with a much later anchor
+    later = EngagementAggregator(half_life=pd.Timedelta(hours=1))
+    later.update(_interaction_df([("1", "0xa", "like", 1000)]))
+    aggregator.merge(later)
+    assert np.isfinite(aggregator.scores().to_numpy()).all()
+    assert aggregator.scores().loc["0xa", "like"] == pytest.approx(1.0)
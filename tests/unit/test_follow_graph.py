@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from mbd_core.data.farcaster.follow_graph import FollowGraph
+from mbd_core.data.farcaster.transform_functions import get_user_interaction_df
+from mbd_core.data.schema import USER_INTERACTION_SCHEMA
+
+
+def _links_df(rows):
+    return pd.DataFrame(
+        [
+            {
+                "fid": fid,
+                "target_fid": target_fid,
+                "type": "follow",
+                "timestamp": pd.Timestamp("2024-07-01", tz="UTC")
+                + pd.Timedelta(minutes=minute),
+                "deleted_at": "2024-07-01" if deleted else None,
+            }
+            for fid, target_fid, minute, deleted in rows
+        ]
+    )
+
+
+def test_get_user_interaction_df():
+    links_df = _links_df(
+        [(1, 2, 0, False), (1, 3, 0, False), (1, 3, 5, True), (2, 3, 1, False)]
+    )
+    user_interaction_df = get_user_interaction_df(links_df)
+    USER_INTERACTION_SCHEMA.validate(user_interaction_df)
+    assert user_interaction_df[["user1", "user2"]].to_numpy().tolist() == [
+        ["1", "2"],
+        ["2", "3"],
+    ]
+
+    graph = FollowGraph.from_user_interaction_df(user_interaction_df)
+    assert graph.num_edges == 2  # noqa: PLR2004
+    assert graph.following(1).tolist() == [2]
+
+
+def test_follow_graph_incremental_links():
+    graph = FollowGraph()
+    graph.apply_links(
+        _links_df(
+            [
+                (10, 20, 0, False),
+                (10, 30, 0, False),
+                (20, 30, 0, False),
+                (20, 40, 0, False),
+                (30, 40, 0, False),
+                (30, 10, 0, False),
+            ]
+        )
+    )
+    assert graph.num_users == 4  # noqa: PLR2004
+    assert graph.num_edges == 6  # noqa: PLR2004
+    assert sorted(graph.followers(40).tolist()) == [20, 30]
+    assert graph.follower_counts().to_dict() == {10: 1, 20: 1, 30: 2, 40: 2}
+    assert graph.two_hop(10).to_dict() == {40: 2}
+    assert graph.two_hop(10, exclude_following=False).to_dict() == {40: 2, 30: 1}
+
+    graph.apply_links(
+        _links_df([(10, 30, 1, True), (10, 30, 2, False), (20, 40, 1, True)])
+    )
+    graph.apply_links(_links_df([(99, 98, 3, True), (50, 10, 3, False)]))
+    assert graph.num_edges == 6  # noqa: PLR2004
+    assert sorted(graph.followers(10).tolist()) == [30, 50]
+    assert graph.following_counts()[20] == 1
+    assert graph.two_hop(20).to_dict() == {10: 1, 40: 1}
+
+
+def test_follow_graph_unknown_fid():
+    graph = FollowGraph()
+    graph.add_edges(np.array([1]), np.array([2]))
+    assert graph.following(3).size == 0
+    assert graph.followers(3).size == 0
+    assert graph.two_hop(3).empty
+    assert graph.followers(2).tolist() == [1]
+
+
+def _csr_pairs(graph, csr):
+    indptr, indices = csr
+    fids = graph._fids
+    return {
+        (fids[node], fids[neighbour])
+        for node in range(graph.num_users)
+        for neighbour in indices[indptr[node] : indptr[node + 1]]
+    }
+
+
+def test_follow_graph_csr_matches_edges():
+    rng = np.random.default_rng(0)
+    graph = FollowGraph()
+    edges = set()
+    for _ in range(20):
+        added = rng.integers(0, 30, size=(40, 2))
+        removed = rng.integers(0, 30, size=(20, 2))
+        graph.add_edges(added[:, 0], added[:, 1])
+        graph.remove_edges(removed[:, 0], removed[:, 1])
+        edges |= set(map(tuple, added.tolist()))
+        edges -= set(map(tuple, removed.tolist()))
+    assert graph.num_edges == len(edges)
+
+    assert _csr_pairs(graph, graph.following_csr) == edges
+    assert {(b, a) for a, b in _csr_pairs(graph, graph.followers_csr)} == edges
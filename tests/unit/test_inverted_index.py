@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mbd_core.data.inverted_index import InvertedIndex
+
+START = pd.Timestamp("2024-07-01", tz="UTC")
+
+
+def _item_df(rows):
+    return pd.DataFrame(
+        rows, columns=["item_id", "hours", "lists", "embed_items", "embed_users"]
+    ).assign(
+        item_creation_timestamp=lambda x: START + pd.to_timedelta(x["hours"], unit="h")
+    )
+
+
+ITEM_DF = _item_df(
+    [
+        ["0xa", 0, ["chan/a"], ["https://a.com"], ["1"]],
+        ["0xb", 3, ["chan/a"], [], ["1", "2"]],
+        ["0xc", 1, ["chan/b"], ["https://a.com"], None],
+        ["0xd", 2, [], np.array(["https://b.com"]), ["2"]],
+    ]
+)
+
+
+def test_postings_and_intersect():
+    index = InvertedIndex()
+    index.append(ITEM_DF)
+    assert index.num_items == 4  # noqa: PLR2004
+    assert index.items("lists", "chan/a").tolist() == ["0xa", "0xb"]
+    assert index.items("embed_items", "https://a.com").tolist() == ["0xa", "0xc"]
+    assert index.items("lists", "chan/z").tolist() == []
+    assert index.keys("embed_users").to_dict() == {"1": 2, "2": 2}
+
+    assert index.intersect([("lists", "chan/a"), ("embed_users", "2")]).tolist() == [
+        "0xb"
+    ]
+    assert index.intersect(
+        [("embed_users", "1"), ("embed_users", "2"), ("lists", "chan/a")]
+    ).tolist() == ["0xb"]
+    assert index.intersect([("lists", "chan/b"), ("embed_users", "1")]).tolist() == []
+    assert index.intersect([("lists", "chan/z"), ("embed_users", "1")]).tolist() == []
+    assert index.intersect([]).tolist() == []
+    with pytest.raises(KeyError, match="not indexed"):
+        index.items("text", "x")
+
+
+def test_append_and_recent():
+    index = InvertedIndex(columns=["lists"])
+    index.append(ITEM_DF.iloc[:2])
+    assert index.recent("lists", "chan/a").tolist() == ["0xb", "0xa"]
+    index.append(
+        _item_df(
+            [
+                ["0xe", 5, ["chan/a"], [], []],
+                ["0xf", 4, ["chan/a", "chan/b"], [], []],
+                # an indexed item gets new keys, its postings are not duplicated
+                ["0xa", 0, ["chan/a", "chan/c"], [], []],
+            ]
+        )
+    )
+    index.append(ITEM_DF.iloc[:0])
+    # a batch of already indexed items adds no item
+    index.append(_item_df([["0xb", 3, ["chan/a"], [], []]]))
+    assert index.num_items == 4  # noqa: PLR2004
+    assert index.items("lists", "chan/a").tolist() == ["0xa", "0xb", "0xe", "0xf"]
+    assert index.items("lists", "chan/c").tolist() == ["0xa"]
+    assert index.recent("lists", "chan/a", n=3).tolist() == ["0xe", "0xf", "0xb"]
+    assert index.recent(
+        "lists", "chan/a", before=START + pd.Timedelta(hours=4)
+    ).tolist() == ["0xb", "0xa"]
+
+    # items created again move in the recency order of all their keys
+    index.append(_item_df([["0xa", 7, ["chan/c"], [], []]]))
+    assert index.recent("lists", "chan/a", n=2).tolist() == ["0xa", "0xe"]
+    # even when the batch does not have the indexed column
+    index.append(
+        pd.DataFrame(
+            {
+                "item_id": ["0xf"],
+                "item_creation_timestamp": [START + pd.Timedelta(hours=8)],
+            }
+        )
+    )
+    assert index.recent("lists", "chan/b").tolist() == ["0xf"]
+    assert index.recent("lists", "chan/a", n=2).tolist() == ["0xf", "0xa"]
+
+
+def test_intersect_large_postings():
+    rng = np.random.default_rng(0)
+    n = 10000
+    channels = rng.integers(0, 5, size=n)
+    mentions = rng.integers(0, 50, size=n)
+    item_df = pd.DataFrame(
+        {
+            "item_id": [f"0x{i}" for i in range(n)],
+            "item_creation_timestamp": START,
+            "lists": [[f"chan/{c}"] for c in channels],
+            "embed_users": [[str(m), str(m + 1)] for m in mentions],
+        }
+    )
+    index = InvertedIndex()
+    for start in range(0, n, 3000):
+        index.append(item_df.iloc[start : start + 3000])
+    # users m and m + 1 are mentioned together
+    mentioned = np.isin(mentions, [6, 7])
+    expected = item_df["item_id"][(channels == 1) & mentioned]
+    assert (
+        index.intersect([("lists", "chan/1"), ("embed_users", "7")]).tolist()
+        == expected.tolist()
+    )
+    # items of the same time are ordered from the last appended
+    channel_items = item_df["item_id"][channels == 1]
+    assert (
+        index.recent("lists", "chan/1", n=5).tolist()
+        == channel_items[::-1][:5].tolist()
+    )
+
+
+def test_save_and_load(tmp_path):
+    index = InvertedIndex()
+    index.append(ITEM_DF)
+    index.save(tmp_path / "index.npz")
+    loaded = InvertedIndex.load(tmp_path / "index.npz")
+    assert loaded.columns == index.columns
+    for column in index.columns:
+        pd.testing.assert_series_equal(loaded.keys(column), index.keys(column))
+    assert loaded.recent("lists", "chan/a").tolist() == ["0xb", "0xa"]
+
+    loaded.append(_item_df([["0xg", 6, ["chan/a"], [], []]]))
+    assert loaded.recent("lists", "chan/a", n=1).tolist() == ["0xg"]
+    assert loaded.items("embed_items", "https://b.com").tolist() == ["0xd"]
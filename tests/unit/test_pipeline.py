@@ -0,0 +1,92 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mbd_core.data.pipeline import Stage, StageError, enumerate_chunks, run_pipeline
+
+
+async def _async_source(n):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i
+
+
+def test_run_pipeline_keeps_source_order():
+    async def slow_double(x):
+        await asyncio.sleep(0.01 * (5 - x))
+        return 2 * x
+
+    stages = [
+        Stage("double", slow_double, workers=3),
+        Stage("increment", lambda x: x + 1),
+        Stage("square", lambda x: x * x, blocking=False),
+    ]
+    assert asyncio.run(run_pipeline(range(5), stages)) == [1, 9, 25, 49, 81]
+    assert asyncio.run(run_pipeline(_async_source(5), stages)) == [1, 9, 25, 49, 81]
+    assert asyncio.run(run_pipeline([], stages)) == []
+
+
+def test_enumerate_chunks_keeps_index_across_stages():
+    async def slow_double(indexed):
+        index, x = indexed
+        await asyncio.sleep(0.01 * (5 - x))
+        return index, 2 * x
+
+    stages = [Stage("double", slow_double, workers=3)]
+    expected = [(i, 2 * i) for i in range(5)]
+    assert asyncio.run(run_pipeline(enumerate_chunks(range(5)), stages)) == expected
+    assert (
+        asyncio.run(run_pipeline(enumerate_chunks(_async_source(5)), stages))
+        == expected
+    )
+
+
+def test_run_pipeline_overlaps_stages():
+    def sleep(x):
+        time.sleep(0.05)
+        return x
+
+    stages = [Stage("a", sleep), Stage("b", sleep), Stage("c", sleep)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        result = asyncio.run(run_pipeline(range(6), stages, executor=executor))
+    # 8 steps of 50ms when pipelined instead of 18 when sequential
+    assert time.perf_counter() - start < 0.6  # noqa: PLR2004
+    assert result == list(range(6))
+
+
+def test_run_pipeline_bounds_queues():
+    consumed = []
+
+    def source():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+
+    async def blocked(_):
+        await asyncio.Event().wait()
+
+    async def run():
+        task = asyncio.ensure_future(
+            run_pipeline(source(), [Stage("blocked", blocked)], queue_size=2)
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    # one chunk in the stage, two in its queue and one waiting to be put
+    assert len(consumed) <= 4  # noqa: PLR2004
+
+
+def test_run_pipeline_raises_stage_error():
+    def fail_on_two(x):
+        if x == 2:  # noqa: PLR2004
+            msg = "boom"
+            raise ValueError(msg)
+        return x
+
+    with pytest.raises(StageError, match="Stage check failed on chunk 2") as e:
+        asyncio.run(run_pipeline(range(100), [Stage("check", fail_on_two)]))
+    assert isinstance(e.value.__cause__, ValueError)
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mbd_core.data.trending import CountMinSketch, TrendingTracker
+
+START = pd.Timestamp("2024-07-01", tz="UTC")
+
+
+def _zipf_keys(n, seed=0):
+    ranks = np.random.default_rng(seed).zipf(1.5, size=n)
+    return pd.Series([f"0x{r}" for r in ranks])
+
+
+def _timestamps(n, hours, seed=0):
+    seconds = np.random.default_rng(seed).integers(0, hours * 3600, size=n)
+    return pd.Series(START + pd.to_timedelta(seconds, unit="s"))
+
+
+def test_count_min_sketch():
+    keys = _zipf_keys(20000)
+    sketch = CountMinSketch.from_error(epsilon=1e-3, delta=0.01)
+    assert (sketch.width, sketch.depth) == (2719, 5)
+    sketch.add(keys.to_numpy(), np.ones(len(keys)))
+    true_counts = keys.value_counts()
+    estimates = sketch.estimate(true_counts.index.to_numpy())
+    assert (estimates >= true_counts.to_numpy()).all()
+    assert (estimates - true_counts.to_numpy()).max() <= 1e-3 * 20000 * 2
+    assert len(sketch.estimate(np.array([]))) == 0
+
+    other = CountMinSketch.from_error(epsilon=1e-3, delta=0.01)
+    other.add(np.array(["0x1"]), np.array([5.0]))
+    sketch.merge(other)
+    assert sketch.estimate(np.array(["0x1"]))[0] >= true_counts["0x1"] + 5
+    with pytest.raises(ValueError, match="dimensions"):
+        sketch.merge(CountMinSketch(10, 2))
+
+
+def test_top_k_matches_exact_counts():
+    keys, timestamps = _zipf_keys(50000), _timestamps(50000, hours=6)
+    tracker = TrendingTracker(k=10, n_buckets=6, epsilon=1e-3)
+    for start in range(0, 50000, 5000):
+        tracker.update(keys[start : start + 5000], timestamps[start : start + 5000])
+
+    top = tracker.top_k()
+    assert top.index.tolist() == keys.value_counts().index[:10].tolist()
+    last_hour = keys[timestamps >= START + pd.Timedelta(hours=5)]
+    top = tracker.top_k(k=3, window=pd.Timedelta(hours=1))
+    assert top.index.tolist() == last_hour.value_counts().index[:3].tolist()
+
+
+def test_buckets_slide():
+    tracker = TrendingTracker(k=2, n_buckets=2)
+    tracker.update(pd.Series(["a", "b", "b"]), pd.Series([START] * 3))
+    tracker.update(
+        pd.Series(["c", "b", None]),
+        pd.Series([START + pd.Timedelta(hours=1)] * 3),
+        counts=pd.Series([5.0, 1.0, 1.0]),
+    )
+    assert tracker.top_k().to_dict() == {"c": 5.0, "b": 3.0}
+    tracker.update(
+        pd.Series(["a", "a"]), pd.Series([START + pd.Timedelta(hours=2)] * 2)
+    )
+    assert tracker.top_k().to_dict() == {"c": 5.0, "a": 2.0}
+    # too old to be kept
+    tracker.update(pd.Series(["d"]), pd.Series([START]))
+    tracker.update(pd.Series([], dtype=object), pd.Series([], dtype="M8[ns, UTC]"))
+    assert "d" not in tracker.top_k(k=10)
+    assert TrendingTracker().top_k().empty
+
+
+def test_merge():
+    keys, timestamps = _zipf_keys(20000), _timestamps(20000, hours=3)
+    whole = TrendingTracker(k=5, epsilon=1e-3)
+    whole.update(keys, timestamps)
+    parts = [TrendingTracker(k=5, epsilon=1e-3) for _ in range(3)]
+    for i, part in enumerate(parts):
+        part.update(keys[i::3], timestamps[i::3])
+    merged = TrendingTracker(k=5, epsilon=1e-3)
+    merged.merge(TrendingTracker(k=5, epsilon=1e-3))
+    for part in parts:
+        merged.merge(part)
+    pd.testing.assert_series_equal(merged.top_k(), whole.top_k())
+    with pytest.raises(ValueError, match="configurations"):
+        merged.merge(TrendingTracker(k=6))
+
+    # buckets of the other tracker older than the window are not merged
+    stale = TrendingTracker(k=5, epsilon=1e-3)
+    stale.update(pd.Series(["0xold"]), pd.Series([START - pd.Timedelta(days=2)]))
+    merged.merge(stale)
+    pd.testing.assert_series_equal(merged.top_k(), whole.top_k())
+
+
+def test_update_from_interactions_and_items():
+    interaction_df = pd.DataFrame(
+        {
+            "item_id": ["0xa", "0xb", "0xb", "0xc"],
+            "event_type": ["like", "like", "share", "like"],
+            "timestamp": [START] * 4,
+            "event_value": [1.0, 1.0, None, 4.0],
+        }
+    )
+    tracker = TrendingTracker()
+    tracker.update_interactions(interaction_df)
+    assert tracker.top_k().to_dict() == {"0xc": 4.0, "0xb": 2.0, "0xa": 1.0}
+    tracker = TrendingTracker()
+    tracker.update_interactions(
+        interaction_df.drop(columns="event_value"), event_types=["like"]
+    )
+    assert tracker.top_k().to_dict() == {"0xa": 1.0, "0xb": 1.0, "0xc": 1.0}
+
+    item_df = pd.DataFrame(
+        {
+            "lists": [["chan/a"], [], ["chan/a", "chan/b"]],
+            "item_creation_timestamp": [START] * 3,
+        }
+    )
+    tracker = TrendingTracker()
+    tracker.update_items(item_df, "lists")
+    assert tracker.top_k().to_dict() == {"chan/a": 2.0, "chan/b": 1.0}
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mbd_core.enrich.schema import USER_ENRICH_SCHEMA
+from mbd_core.enrich.user_embedding import (
+    UserEmbeddingAggregator,
+    sparse_dense_matmul,
+)
+
+
+def _interaction_df(rows):
+    return pd.DataFrame(
+        rows, columns=["user_id", "item_id", "event_type", "timestamp"]
+    ).assign(
+        protocol="farcaster",
+        timestamp=lambda x: pd.to_datetime(x["timestamp"], utc=True),
+    )
+
+
+ITEM_EMBED_DF = pd.DataFrame(
+    {
+        "item_id": ["0xa", "0xb", "0xc", "0xd"],
+        "item_sem_embed": [
+            np.array([1.0, 0.0]),
+            np.array([0.0, 1.0]),
+            np.array([1.0, 1.0]),
+            None,
+        ],
+    }
+)
+
+
+def test_sparse_dense_matmul(monkeypatch):
+    monkeypatch.setattr("mbd_core.enrich.user_embedding.CHUNK_SIZE", 3)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 5, size=20)
+    cols = rng.integers(0, 4, size=20)
+    data = rng.random(20)
+    dense = rng.random((4, 3))
+    expected = np.zeros((6, 4))
+    np.add.at(expected, (rows, cols), data)
+    unique_rows, product = sparse_dense_matmul(rows, cols, data, dense)
+    np.testing.assert_array_equal(unique_rows, np.unique(rows))
+    np.testing.assert_allclose(product, (expected @ dense)[unique_rows])
+
+
+def test_weighted_mean_and_incremental_update():
+    aggregator = UserEmbeddingAggregator(event_weights={"like": 1.0, "share": 3.0})
+    aggregator.update(
+        _interaction_df(
+            [
+                ["1", "0xa", "like", "2024-07-01 00:00"],
+                ["1", "0xb", "share", "2024-07-01 01:00"],
+                ["2", "0xc", "like", "2024-07-01 02:00"],
+                ["2", "0xa", "post", "2024-07-01 03:00"],
+                ["3", "0xd", "like", "2024-07-01 04:00"],
+                ["3", "0xz", "like", "2024-07-01 04:00"],
+            ]
+        ),
+        ITEM_EMBED_DF,
+    )
+    assert aggregator.num_users == 2  # noqa: PLR2004
+    np.testing.assert_allclose(
+        aggregator.embeddings().loc[["1", "2"]], [[0.25, 0.75], [1.0, 1.0]]
+    )
+
+    aggregator.update(
+        _interaction_df(
+            [
+                ["2", "0xa", "like", "2024-07-02 00:00"],
+                ["4", "0xb", "like", "2024-07-02 01:00"],
+            ]
+        ).assign(event_value=[2.0, None]),
+        ITEM_EMBED_DF,
+    )
+    embeddings = aggregator.embeddings()
+    np.testing.assert_allclose(embeddings.loc["2"], [1.0, 1 / 3])
+    np.testing.assert_allclose(embeddings.loc["4"], [0.0, 1.0])
+
+    aggregator.update(
+        _interaction_df([["5", "0xz", "like", "2024-07-03"]]), ITEM_EMBED_DF
+    )
+    assert aggregator.num_users == 3  # noqa: PLR2004
+    with pytest.raises(ValueError, match="dimension"):
+        aggregator.update(
+            _interaction_df([["5", "0xe", "like", "2024-07-03"]]),
+            pd.DataFrame({"item_id": ["0xe"], "item_sem_embed": [np.ones(3)]}),
+        )
+
+
+def test_arrays_grow_geometrically(monkeypatch):
+    monkeypatch.setattr("mbd_core.enrich.user_embedding.MIN_CAPACITY", 2)
+    aggregator = UserEmbeddingAggregator()
+    for user in range(5):
+        aggregator.update(
+            _interaction_df([[str(user), "0xa", "like", "2024-07-01"]]), ITEM_EMBED_DF
+        )
+    assert aggregator.num_users == 5  # noqa: PLR2004
+    assert len(aggregator._weights) == 8  # noqa: PLR2004
+    np.testing.assert_allclose(aggregator.embeddings(), np.tile([1.0, 0.0], (5, 1)))
+    assert len(aggregator.to_frame(namespace="all")) == 5  # noqa: PLR2004
+
+
+def test_time_decay(monkeypatch):
+    monkeypatch.setattr("mbd_core.enrich.user_embedding.MAX_DECAY_EXPONENT", 1.5)
+    aggregator = UserEmbeddingAggregator(half_life=pd.Timedelta(hours=1))
+    aggregator.update(
+        _interaction_df([["1", "0xa", "like", "2024-07-01 00:00"]]), ITEM_EMBED_DF
+    )
+    aggregator.update(
+        _interaction_df([["1", "0xb", "like", "2024-07-01 01:00"]]), ITEM_EMBED_DF
+    )
+    np.testing.assert_allclose(aggregator.embeddings().loc["1"], [1 / 3, 2 / 3])
+    # the anchor is rebased, the means are unchanged by the rescaling
+    aggregator.update(
+        _interaction_df([["1", "0xb", "like", "2024-07-01 03:00"]]), ITEM_EMBED_DF
+    )
+    np.testing.assert_allclose(aggregator.embeddings().loc["1"], [1 / 11, 10 / 11])
+
+
+def test_to_frame_follows_schema():
+    aggregator = UserEmbeddingAggregator()
+    aggregator.update(
+        _interaction_df(
+            [
+                ["1", "0xa", "like", "2024-07-01 01:00"],
+                ["1", "0xb", "post", "2024-07-01 00:00"],
+                ["2", "0xc", "comment", "2024-07-01 02:00"],
+            ]
+        ),
+        ITEM_EMBED_DF,
+    )
+    user_df = USER_ENRICH_SCHEMA.validate(aggregator.to_frame(namespace="all"))
+    assert user_df["user_id"].tolist() == ["1", "2"]
+    assert user_df["user_update_timestamp"].tolist() == [
+        pd.Timestamp("2024-07-01 01:00", tz="UTC"),
+        pd.Timestamp("2024-07-01 02:00", tz="UTC"),
+    ]
+    assert (user_df["event_type"] == "all").all()
+    np.testing.assert_allclose(user_df["user_sem_embed"].iloc[0], [0.5, 0.5])
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mbd_core.enrich.vector_index import VectorIndex
+
+
+def _random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_exact_query_matches_brute_force(monkeypatch):
+    monkeypatch.setattr("mbd_core.enrich.vector_index.CORPUS_BLOCK_SIZE", 7)
+    monkeypatch.setattr("mbd_core.enrich.vector_index.QUERY_BATCH_SIZE", 3)
+    vectors = _random_vectors(50)
+    ids = [f"0x{i}" for i in range(50)]
+    index = VectorIndex(dim=16, metric="dot")
+    index.upsert(ids, vectors)
+    queries = _random_vectors(5, seed=1)
+
+    result_ids, scores = index.query(queries, top_k=4)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :4]
+    assert result_ids.tolist() == np.array(ids)[expected].tolist()
+    np.testing.assert_allclose(
+        scores, np.take_along_axis(queries @ vectors.T, expected, axis=1), rtol=1e-5
+    )
+    assert index.query(queries, top_k=100)[0].shape == (5, 50)
+
+
+def test_upsert_delete_and_namespaces():
+    index = VectorIndex(dim=2)
+    index.upsert(["a", "b"], [[1, 0], [0, 1]], namespace="like")
+    index.upsert(["a", "c", "c"], [[0, 2], [1, 1], [-1, 0]], namespace="like")
+    index.upsert(["a"], [[1, 0]], namespace="share")
+    assert sorted(index.namespaces) == ["like", "share"]
+    assert index.size("like") == 3  # noqa: PLR2004
+    np.testing.assert_allclose(
+        index.fetch(["a", "c"], namespace="like"), [[0, 1], [-1, 0]]
+    )
+    assert np.isnan(index.fetch(["z"], namespace="like")).all()
+    assert np.isnan(index.fetch(["a"], namespace="comment")).all()
+    # the index of the ids is kept until they change
+    row_index = index._namespaces["like"].row_index()
+    index.upsert(["a"], [[0, 1]], namespace="like")
+    assert index._namespaces["like"].row_index() is row_index
+
+    ids, scores = index.query([[0, 1]], top_k=1, namespace="like")
+    assert ids.tolist() == [["a"]]
+    assert scores[0, 0] == pytest.approx(1.0)
+    assert index.query([[0, 1]], namespace="share")[0].tolist() == [["a"]]
+    assert index.query([[0, 1]], namespace="comment")[0].shape == (1, 0)
+
+    index.delete(["a", "z"], namespace="like")
+    index.delete(["a"], namespace="share")
+    index.delete(["a"], namespace="comment")
+    assert index.namespaces == ["like"]
+    assert sorted(index.query([[0, 1]], namespace="like")[0][0]) == ["b", "c"]
+
+    with pytest.raises(ValueError, match="dimension"):
+        index.upsert(["d"], [[1, 2, 3]])
+    with pytest.raises(ValueError, match="Unknown metric"):
+        VectorIndex(dim=2, metric="l2")
+
+
+def test_ivf_query():
+    centers = _random_vectors(8, seed=2) * 10
+    labels = np.repeat(np.arange(8), 50)
+    vectors = centers[labels] + _random_vectors(400, seed=3)
+    ids = [str(i) for i in range(400)]
+    index = VectorIndex(dim=16)
+    index.upsert(ids, vectors)
+    index.build_ivf(n_lists=8)
+    queries = centers + _random_vectors(8, seed=4) * 0.1
+
+    exact_ids, _ = index.query(queries, top_k=5)
+    approx_ids, _ = index.query(queries, top_k=5, nprobe=2)
+    recall = np.mean(
+        [len(set(a) & set(e)) / 5 for a, e in zip(approx_ids, exact_ids, strict=True)]
+    )
+    assert recall >= 0.9  # noqa: PLR2004
+    all_ids, _ = index.query(queries, top_k=5, nprobe=8)
+    assert all_ids.tolist() == exact_ids.tolist()
+
+    # vectors upserted after the build are assigned to the existing clusters
+    index.upsert(["new"], centers[:1])
+    assert index.query(centers[:1], top_k=1, nprobe=1)[0].tolist() == [["new"]]
+    index.delete(["new"])
+    assert index.query(centers[:1], top_k=1, nprobe=1)[0].tolist() != [["new"]]
+
+    # the cluster of the first center is empty once its vectors are deleted
+    index.delete(ids[:50])
+    empty_ids, empty_scores = index.query(centers[:1], top_k=1, nprobe=1)
+    assert empty_ids.tolist() == [[""]]
+    assert empty_scores.tolist() == [[-np.inf]]
+
+
+def test_save_and_load(tmp_path):
+    index = VectorIndex(dim=16)
+    index.upsert([str(i) for i in range(20)], _random_vectors(20), namespace="like")
+    index.upsert(["x"], _random_vectors(1), namespace="share")
+    index.build_ivf(namespace="like", n_lists=2)
+    index.save(tmp_path / "index")
+
+    loaded = VectorIndex.load(tmp_path / "index")
+    assert isinstance(loaded._namespaces["like"].vectors, np.memmap)
+    queries = _random_vectors(3, seed=5)
+    for namespace in ["like", "share"]:
+        assert (
+            loaded.query(queries, namespace=namespace)[0].tolist()
+            == index.query(queries, namespace=namespace)[0].tolist()
+        )
+    assert (
+        loaded.query(queries, namespace="like", nprobe=2)[0].tolist()
+        == index.query(queries, namespace="like", nprobe=2)[0].tolist()
+    )
+    loaded.upsert(["0"], _random_vectors(1, seed=6), namespace="like")
+    assert loaded.size("like") == 20  # noqa: PLR2004
+
+    # namespaces keep their directory, those of deleted namespaces are removed
+    loaded.delete(["x"], namespace="share")
+    loaded.save(tmp_path / "index")
+    assert [path.name for path in (tmp_path / "index").glob("namespace-*")] == [
+        "namespace-" + b"like".hex()
+    ]
+    assert VectorIndex.load(tmp_path / "index").namespaces == ["like"]
+
+
+def test_save_to_loaded_path(tmp_path):
+    index = VectorIndex(dim=16, metric="dot")
+    vectors = _random_vectors(200)
+    index.upsert([str(i) for i in range(200)], vectors)
+    index.save(tmp_path)
+
+    # the vectors of the loaded index are memory-mapped from the saved files
+    loaded = VectorIndex.load(tmp_path)
+    loaded.build_ivf(n_lists=4)
+    loaded.save(tmp_path)
+    reloaded = VectorIndex.load(tmp_path)
+    np.testing.assert_array_equal(reloaded.fetch(["0", "199"]), vectors[[0, 199]])
+    queries = _random_vectors(3, seed=7)
+    assert (
+        reloaded.query(queries, nprobe=4)[0].tolist()
+        == index.query(queries)[0].tolist()
+    )
+
+
+def test_upsert_df():
+    user_df = pd.DataFrame(
+        {
+            "user_id": ["1", "2", "3", "1"],
+            "event_type": ["like", "like", "share", "share"],
+            "user_sem_embed": [np.array([1.0, 0.0]), [0.0, 1.0], None, [1.0, 1.0]],
+        }
+    )
+    index = VectorIndex(dim=2)
+    index.upsert_df(user_df, "user_id", "user_sem_embed")
+    assert index.size("like") == 2  # noqa: PLR2004
+    assert index.size("share") == 1
+
+    item_df = pd.DataFrame({"item_id": ["0xa"], "item_sem_embed": [[1.0, 0.0]]})
+    index.upsert_df(item_df, "item_id", "item_sem_embed", namespace_column=None)
+    assert index.query([[1, 0]])[0].tolist() == [["0xa"]]